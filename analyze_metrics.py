@@ -1,5 +1,5 @@
-from entity_disambiguation import EntityDisambiguator
-from entity_disambiguation_hybrid import HybridEntityDisambiguator
+import disambiguator_registry
+from fixtures import ENTITIES, cached_embeddings
 import numpy as np
 
 
@@ -36,25 +36,16 @@ def main():
     print("Analyzing why metrics differ between approaches...")
     
     # Initialize
-    original = EntityDisambiguator()
-    hybrid = HybridEntityDisambiguator()
+    original = disambiguator_registry.get("EntityDisambiguator")
+    hybrid = disambiguator_registry.get("HybridEntityDisambiguator")
     
     # Entities
-    entities = [
-        {"id": "1", "descriptor": "John Smith - Software Engineer at Google"},
-        {"id": "2", "descriptor": "John Smith - Professor of Physics at MIT"},
-        {"id": "3", "descriptor": "John Doe - Data Scientist at Microsoft"},
-        {"id": "4", "descriptor": "Jane Smith - Product Manager at Apple"},
-        {"id": "5", "descriptor": "Michael Johnson - Olympic Athlete"},
-        {"id": "6", "descriptor": "Michael Jordan - Basketball Player"},
-        {"id": "7", "descriptor": "Sarah Johnson - CEO of Tech Startup"},
-        {"id": "8", "descriptor": "John Williams - Composer"},
-        {"id": "9", "descriptor": "Robert Johnson - Blues Musician"},
-    ]
+    entities = ENTITIES
     
-    # Create embeddings
-    original_embeddings = original.create_entity_embeddings(entities)
-    hybrid_embeddings = hybrid.create_entity_embeddings(entities)
+    # Create embeddings (cached per class and entity set)
+    entity_ids = tuple(e["id"] for e in entities)
+    original_embeddings = cached_embeddings("EntityDisambiguator", entity_ids)
+    hybrid_embeddings = cached_embeddings("HybridEntityDisambiguator", entity_ids)
     
     # Analyze behavior
     analyze_approach_behavior(original, entities, original_embeddings, "ORIGINAL")
@@ -1,5 +1,5 @@
-from entity_disambiguation import EntityDisambiguator
-from entity_disambiguation_improved import ImprovedEntityDisambiguator
+import disambiguator_registry
+from fixtures import ENTITIES, TEST_CASES, cached_embeddings
 from evaluate_metrics import evaluate_disambiguator
 
 
@@ -12,107 +12,17 @@ def analyze_perfect_f1_cases():
     print("- In other words: returned exactly the expected set of entities, no more, no less")
     
     # Initialize
-    original = EntityDisambiguator()
-    improved = ImprovedEntityDisambiguator()
-    
-    # Define entities
-    entities = [
-        {"id": "1", "descriptor": "John Smith - Software Engineer at Google"},
-        {"id": "2", "descriptor": "John Smith - Professor of Physics at MIT"},
-        {"id": "3", "descriptor": "John Doe - Data Scientist at Microsoft"},
-        {"id": "4", "descriptor": "Jane Smith - Product Manager at Apple"},
-        {"id": "5", "descriptor": "Michael Johnson - Olympic Athlete"},
-        {"id": "6", "descriptor": "Michael Jordan - Basketball Player"},
-        {"id": "7", "descriptor": "Sarah Johnson - CEO of Tech Startup"},
-        {"id": "8", "descriptor": "John Williams - Composer"},
-        {"id": "9", "descriptor": "Robert Johnson - Blues Musician"},
-    ]
-    
-    # Create embeddings
-    original_embeddings = original.create_entity_embeddings(entities)
-    improved_embeddings = improved.create_entity_embeddings(entities)
+    original = disambiguator_registry.get("EntityDisambiguator")
+    improved = disambiguator_registry.get("ImprovedEntityDisambiguator")
+    
+    # Shared fixture entities and their (cached) embeddings
+    entities = ENTITIES
+    entity_ids = tuple(e["id"] for e in entities)
+    original_embeddings = cached_embeddings("EntityDisambiguator", entity_ids)
+    improved_embeddings = cached_embeddings("ImprovedEntityDisambiguator", entity_ids)
     
     # Test cases
-    test_cases = [
-        {
-            "query": "John",
-            "expected_ids": ["1", "2", "3", "8"],  # 4 expected
-            "description": "First name only",
-            "threshold": 0.5
-        },
-        {
-            "query": "Johnson",
-            "expected_ids": ["5", "7", "9"],  # 3 expected
-            "description": "Last name only",
-            "threshold": 0.5
-        },
-        {
-            "query": "Smith",
-            "expected_ids": ["1", "2", "4"],  # 3 expected
-            "description": "Last name only",
-            "threshold": 0.5
-        },
-        {
-            "query": "John Smith",
-            "expected_ids": ["1", "2"],  # 2 expected
-            "description": "Full name",
-            "threshold": 0.5
-        },
-        {
-            "query": "Michael Johnson",
-            "expected_ids": ["5"],  # 1 expected
-            "description": "Exact full name",
-            "threshold": 0.5
-        },
-        {
-            "query": "Jane Smith",
-            "expected_ids": ["4"],  # 1 expected
-            "description": "Exact full name",
-            "threshold": 0.5
-        },
-        {
-            "query": "Jhon Smith",
-            "expected_ids": ["1", "2"],  # 2 expected
-            "description": "Typo in first name",
-            "threshold": 0.5
-        },
-        {
-            "query": "Micheal Johnson",
-            "expected_ids": ["5"],  # 1 expected
-            "description": "Common misspelling",
-            "threshold": 0.5
-        },
-        {
-            "query": "john smith",
-            "expected_ids": ["1", "2"],  # 2 expected
-            "description": "Lowercase",
-            "threshold": 0.5
-        },
-        {
-            "query": "JOHN SMITH",
-            "expected_ids": ["1", "2"],  # 2 expected
-            "description": "Uppercase",
-            "threshold": 0.5
-        },
-        {
-            "query": "Software Engineer Google",
-            "expected_ids": ["1"],  # 1 expected
-            "description": "Semantic search",
-            "threshold": 0.5
-        },
-        {
-            "query": "Olympic Athlete",
-            "expected_ids": ["5"],  # 1 expected
-            "description": "Semantic search",
-            "threshold": 0.5
-        },
-        {
-            "query": "CEO startup",
-            "expected_ids": ["7"],  # 1 expected
-            "description": "Semantic search",
-            "threshold": 0.5
-        },
-    ]
+    test_cases = TEST_CASES
     
     # Evaluate
     original_results = evaluate_disambiguator(
@@ -1,6 +1,10 @@
 from entity_disambiguation_improved_flexible import ImprovedFlexibleEntityDisambiguator
 from entity_disambiguation_flexible import FlexibleEntityDisambiguator
-import time
+from caching import make_cached_search
+from similarity import normalize_vector, dot_scores, cosine_scores, scoring_backend, RAPIDFUZZ_AVAILABLE
+from time import perf_counter_ns
+import gc
+import timeit
 import numpy as np
 
 
@@ -55,25 +59,43 @@ def analyze_search_patterns():
         "partial_name_semantic": 0
     }
     
+    # Pre-encode every test query in one batched call so the timing loops
+    # below measure only the similarity/matching path
+    all_queries = [query for queries in test_queries.values() for query in queries]
+    query_embs = potion_baseline.encode_batch(all_queries)
+    query_index = {query: i for i, query in enumerate(all_queries)}
+    
+    def time_search(disambiguator, query, query_emb, embeddings, n_warmup=3, n_runs=100):
+        """Steady-state (p50, p90) search time in ms after warm-up calls, and the last result"""
+        for _ in range(n_warmup):
+            disambiguator.search_with_embedding(query, query_emb, entities, embeddings, 0.5)
+        times = []
+        # Keep garbage-collection pauses out of the measured runs
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(n_runs):
+                t0 = perf_counter_ns()
+                result = disambiguator.search_with_embedding(query, query_emb, entities, embeddings, 0.5)
+                times.append(perf_counter_ns() - t0)
+        finally:
+            gc.enable()
+        # Median/p90 instead of mean, so a single scheduler stall doesn't skew the figure
+        p50, p90 = np.percentile(times, [50, 90]) / 1e6  # Convert ns to ms
+        return (p50, p90), result
+    
     for category, queries in test_queries.items():
         print(f"\n{category}:")
         
         for query in queries:
+            i = query_index[query]
+            query_emb = query_embs[i:i+1]
+            
             # Baseline timing
-            baseline_times = []
-            for _ in range(100):  # Run 100 times for accuracy
-                start = time.time()
-                _, _, _ = potion_baseline.search(query, entities, baseline_embeddings, 0.5)
-                baseline_times.append(time.time() - start)
-            baseline_avg = np.mean(baseline_times) * 1000  # Convert to ms
+            (baseline_p50, baseline_p90), _ = time_search(potion_baseline, query, query_emb, baseline_embeddings)
             
             # Improved timing with strategy tracking
-            improved_times = []
-            for _ in range(100):
-                start = time.time()
-                results, _, match_type = potion_improved.search(query, entities, improved_embeddings, 0.5)
-                improved_times.append(time.time() - start)
-            improved_avg = np.mean(improved_times) * 1000
+            (improved_p50, improved_p90), (results, _, match_type) = time_search(potion_improved, query, query_emb, improved_embeddings)
             
             # Track which strategy was used (from last search)
             if results and 'match_type' in results[0]:
@@ -91,11 +113,51 @@ def analyze_search_patterns():
                     else:
                         strategy_counts["semantic_search"] += 1
             
-            speedup = baseline_avg / improved_avg if improved_avg > 0 else float('inf')
-            print(f"  '{query}': Baseline={baseline_avg:.3f}ms, Improved={improved_avg:.3f}ms, Speedup={speedup:.1f}x")
+            speedup = baseline_p50 / improved_p50 if improved_p50 > 0 else float('inf')
+            print(f"  '{query}': Baseline={baseline_p50:.3f}ms (p90={baseline_p90:.3f}), "
+                  f"Improved={improved_p50:.3f}ms (p90={improved_p90:.3f}), Speedup={speedup:.1f}x")
             if results and 'match_type' in results[0]:
                 print(f"    → Strategy used: {results[0]['match_type']}")
     
+    # Repeated-query latency: first (cold) call vs memoized (warm) calls.
+    # The breakdown above deliberately stays uncached so it measures real search cost.
+    print("\n" + "="*80)
+    print("CACHED REPEAT-QUERY LATENCY (Improved):")
+    print("-"*80)
+    
+    cached_search = make_cached_search(potion_improved, entities, improved_embeddings)
+    for query in all_queries:
+        t0 = perf_counter_ns()
+        cached_search(query, 0.5)
+        cold_ms = (perf_counter_ns() - t0) / 1e6
+        
+        t0 = perf_counter_ns()
+        for _ in range(100):
+            cached_search(query, 0.5)
+        warm_ms = (perf_counter_ns() - t0) / 100 / 1e6
+        print(f"  '{query}': cold={cold_ms:.3f}ms, warm={warm_ms:.4f}ms")
+    print(f"  Cache stats: {cached_search.cache_info()}")
+    
+    # Fuzzy backend comparison on the typo queries: RapidFuzz batch cdist vs difflib loop
+    print("\n" + "="*80)
+    print("FUZZY MATCHING BACKEND (Improved, typo queries):")
+    print("-"*80)
+    
+    if not RAPIDFUZZ_AVAILABLE:
+        print("  rapidfuzz not installed - only the difflib path is available")
+    else:
+        for query in test_queries["Typos"]:
+            i = query_index[query]
+            backend_avgs = {}
+            for use_rapidfuzz in (True, False):
+                potion_improved.use_rapidfuzz = use_rapidfuzz
+                t0 = perf_counter_ns()
+                for _ in range(100):
+                    potion_improved.search_with_embedding(query, query_embs[i:i+1], entities, improved_embeddings, 0.5)
+                backend_avgs[use_rapidfuzz] = (perf_counter_ns() - t0) / 100 / 1e6
+            potion_improved.use_rapidfuzz = True
+            print(f"  '{query}': rapidfuzz={backend_avgs[True]:.3f}ms, difflib={backend_avgs[False]:.3f}ms")
+    
     print("\n" + "="*80)
     print("MATCHING STRATEGY DISTRIBUTION:")
     print("-"*80)
@@ -132,36 +194,45 @@ def analyze_search_patterns():
     print("\nDETAILED TIMING ANALYSIS:")
     print("-"*80)
     
-    # Time individual operations
+    # Time individual operations; autorange picks the iteration count so each
+    # measurement spans at least 0.2s, even for sub-microsecond operations
     test_query = "John Smith"
-    n_iterations = 1000
+    
+    def per_call_ms(fn) -> float:
+        iterations, seconds = timeit.Timer(fn).autorange()
+        return seconds / iterations * 1000
     
     # Time embedding computation
-    start = time.time()
-    for _ in range(n_iterations):
-        query_emb = potion_baseline.encode([test_query])
-    embedding_time = (time.time() - start) / n_iterations * 1000
+    embedding_time = per_call_ms(lambda: potion_baseline.encode([test_query]))
     
-    # Time cosine similarity
+    # Time cosine similarity (sklearn for reference if installed, then the SIMD-backed
+    # kernel the search path uses); imported here so the analysis does not need scipy
     query_emb = potion_baseline.encode([test_query]).reshape(1, -1)
-    start = time.time()
-    for _ in range(n_iterations):
+    try:
         from sklearn.metrics.pairwise import cosine_similarity
-        _ = cosine_similarity(query_emb, baseline_embeddings)
-    cosine_time = (time.time() - start) / n_iterations * 1000
+        cosine_time = per_call_ms(lambda: cosine_similarity(query_emb, baseline_embeddings))
+    except ImportError:
+        cosine_time = None
+    simd_cosine_time = per_call_ms(lambda: cosine_scores(query_emb, baseline_embeddings))
+    
+    # Time the search path: entity matrix is pre-normalized, so cosine is one dot product
+    query_unit = normalize_vector(query_emb)
+    dot_time = per_call_ms(lambda: dot_scores(query_unit, baseline_embeddings))
     
-    # Time string comparison
-    start = time.time()
-    for _ in range(n_iterations):
-        for entity in entities:
-            _ = test_query.lower() == entity["descriptor"].lower()
-    string_time = (time.time() - start) / n_iterations * 1000
+    # Time string comparison against descriptors lowercased once up front
+    # (as the improved matcher caches them), using a hash lookup per query
+    query_lower = test_query.lower()
+    lowered_set = {entity["descriptor"].lower() for entity in entities}
+    string_time = per_call_ms(lambda: query_lower in lowered_set)
     
     print(f"Embedding computation: {embedding_time:.3f} ms")
-    print(f"Cosine similarity (6 entities): {cosine_time:.3f} ms")
-    print(f"String comparison (6 entities): {string_time:.3f} ms")
+    if cosine_time is not None:
+        print(f"Cosine similarity, sklearn (6 entities): {cosine_time:.3f} ms")
+    print(f"Cosine similarity, {scoring_backend()} (6 entities): {simd_cosine_time:.3f} ms")
+    print(f"Pre-normalized dot product (6 entities): {dot_time:.3f} ms")
+    print(f"String comparison (6 entities): {string_time:.6f} ms")
     print(f"\nString comparison is {embedding_time/string_time:.0f}x faster than embedding")
-    print(f"String comparison is {(embedding_time + cosine_time)/string_time:.0f}x faster than full semantic search")
+    print(f"String comparison is {(embedding_time + dot_time)/string_time:.0f}x faster than full semantic search")
 
 
 if __name__ == "__main__":
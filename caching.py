@@ -0,0 +1,305 @@
+"""
+Caching helpers for repeated-query workloads (benchmark loops, evaluations, UIs).
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Callable, Optional
+import atexit
+import hashlib
+import os
+import tempfile
+import numpy as np
+from similarity import dot_scores
+
+# Opt-in on-disk location for QueryEmbeddingCache(persist_path=...)
+DEFAULT_QUERY_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "potion", "query_emb.npz")
+# Oldest entries are dropped from the file beyond this size
+MAX_PERSISTED_QUERIES = 50000
+# Opt-in directory for persisted entity embedding matrices (see load_or_encode)
+DEFAULT_EMBEDDING_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "potion", "embeddings")
+
+
+def make_cached_search(disambiguator, entities: List[Dict[str, str]], entity_embeddings,
+                       maxsize: int = 1024) -> Callable:
+    """
+    Memoize disambiguator.search for a fixed entity set.
+
+    Entity embeddings are unhashable (numpy arrays / dicts), so the cache is bound
+    to one entity set and keyed on (query, threshold) only. Cached results are
+    shared between calls and must be treated as read-only.
+    """
+    @lru_cache(maxsize=maxsize)
+    def _cached_search(query: str, threshold: float):
+        return disambiguator.search(query, entities, entity_embeddings, threshold)
+
+    def cached_search(query: str, threshold: float = 0.5):
+        return _cached_search(query, threshold)
+
+    cached_search.cache_info = _cached_search.cache_info
+    cached_search.cache_clear = _cached_search.cache_clear
+    return cached_search
+
+
+def load_or_encode(encode: Callable[[List[str]], np.ndarray], texts: List[str], model_name: str = "",
+                   cache_dir: Optional[str] = None) -> np.ndarray:
+    """
+    Encode texts as a C-contiguous float32 matrix, reusing the one saved by an earlier run.
+
+    Static-model embeddings depend only on the model and the text, so the matrix is
+    stored as emb_<blake2b(model_name, texts)>.npy in cache_dir and loaded instead of
+    re-encoding the same entity list. Without cache_dir this just encodes.
+    """
+    if cache_dir is None:
+        return np.ascontiguousarray(encode(texts), dtype=np.float32)
+    
+    digest = hashlib.blake2b(model_name.encode("utf-8"), digest_size=20)
+    for text in texts:
+        digest.update(b"\0" + text.encode("utf-8"))
+    path = os.path.join(cache_dir, f"emb_{digest.hexdigest()}.npy")
+    if os.path.exists(path):
+        try:
+            return np.load(path, allow_pickle=False)
+        except (OSError, ValueError):
+            pass  # Unreadable file: re-encode and overwrite it
+    
+    embeddings = np.ascontiguousarray(encode(texts), dtype=np.float32)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Written to a temporary file unique to this writer first, so a concurrent reader never sees
+    # a partial file and concurrent writers of the same matrix do not move each other's file
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".npy")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, embeddings)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return embeddings
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of single-query embeddings, keyed by sha1(model_name::query).
+
+    The cache wraps one model's encoder. Disambiguators on the same model may share
+    one instance (see disambiguator_registry.get_query_cache); the model name is part
+    of the key so a shared cache file never mixes models. Returned arrays have shape
+    (1, D) and are marked read-only because they are shared between calls. With
+    persist_path set, entries saved by earlier runs are loaded at start-up and the
+    cache is written back at process exit.
+
+    Not thread-safe: lookups and LRU updates are unlocked, so an instance (and every
+    disambiguator sharing it) must be used from one thread at a time.
+    """
+    
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], model_name: str = "",
+                 capacity: int = 4096, persist_path: Optional[str] = None):
+        self.encode_fn = encode
+        self.model_name = model_name
+        self.capacity = capacity
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.persist_path = persist_path
+        self._disk = {}
+        if persist_path is not None:
+            self._disk = self._load()
+            atexit.register(self.save)
+    
+    def _key(self, query: str) -> str:
+        return hashlib.sha1(f"{self.model_name}::{query}".encode("utf-8")).hexdigest()
+    
+    def _load(self) -> Dict[str, np.ndarray]:
+        """Entries of the persisted cache file (all models), or {} if missing or unreadable"""
+        if not os.path.exists(self.persist_path):
+            return {}
+        try:
+            with np.load(self.persist_path, allow_pickle=False) as data:
+                return {key: data[key] for key in data.files}
+        except (OSError, ValueError):
+            return {}
+    
+    def save(self):
+        """
+        Merge this cache into the persisted file (written atomically). Concurrent savers
+        never corrupt the file, but the last one to finish may drop the other's new entries.
+        """
+        if self.persist_path is None or not (self.cache or self._disk):
+            return
+        # Re-read so entries saved by other instances since start-up are kept
+        entries = self._load()
+        entries.update(self._disk)
+        entries.update(self.cache)
+        keys = list(entries)[-MAX_PERSISTED_QUERIES:]
+        
+        cache_dir = os.path.dirname(self.persist_path) or "."
+        os.makedirs(cache_dir, exist_ok=True)
+        # Temporary file unique to this writer: processes exiting together each replace
+        # the file whole instead of moving one another's partial writes
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **{key: entries[key] for key in keys})
+            os.replace(tmp_path, self.persist_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters, hit rate and current size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.cache),
+            "persisted": len(self._disk),
+        }
+    
+    def _store(self, key: str, embedding: np.ndarray) -> np.ndarray:
+        embedding.flags.writeable = False
+        self.cache[key] = embedding
+        if len(self.cache) > self.capacity:
+            # Remove least recently used
+            self.cache.popitem(last=False)
+        return embedding
+    
+    def encode(self, query: str) -> np.ndarray:
+        key = self._key(query)
+        if key in self.cache:
+            # Move to end (most recently used)
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return self.cache[key]
+        
+        if key in self._disk:
+            self.hits += 1
+            return self._store(key, self._disk.pop(key).reshape(1, -1))
+        
+        self.misses += 1
+        return self._store(key, np.asarray(self.encode_fn([query]), dtype=np.float32).reshape(1, -1))
+    
+    def encode_batch(self, queries: List[str]) -> np.ndarray:
+        """(M, D) embeddings for several queries; all cache misses are encoded in a single call"""
+        keys = [self._key(query) for query in queries]
+        missing = {}
+        for query, key in zip(queries, keys):
+            if key not in self.cache and key not in self._disk:
+                missing.setdefault(key, query)
+        
+        fresh = {}
+        if missing:
+            encoded = np.asarray(self.encode_fn(list(missing.values())), dtype=np.float32)
+            fresh = dict(zip(missing, encoded.reshape(len(missing), -1)))
+        
+        rows = []
+        for query, key in zip(queries, keys):
+            if key in fresh:
+                self.misses += 1
+                rows.append(self._store(key, fresh.pop(key).reshape(1, -1)))
+            else:
+                rows.append(self.encode(query))
+        return np.vstack(rows)
+
+
+class PrefixCache:
+    """
+    Substring-containment results keyed on the lowercased query.
+
+    Any descriptor containing "john smith" also contains "john", so a new query
+    only needs to scan the hits of its longest cached prefix instead of every
+    entity. This holds for containment filtering only: semantic similarity does
+    not shrink as the query grows, so it must not be used for embedding search.
+    The cache is bound to one entity list and resets when a different one is passed.
+    """
+    
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.cache = OrderedDict()
+        self._entities = None
+        self._descriptors_lower = []
+    
+    def get_seed(self, query_lower: str):
+        """Longest strictly shorter cached prefix of the query, or None"""
+        for length in range(len(query_lower) - 1, 0, -1):
+            if query_lower[:length] in self.cache:
+                return query_lower[:length]
+        return None
+    
+    def matching_indices(self, query: str, entities: List[Dict[str, str]]) -> List[int]:
+        """Indices of entities whose descriptor contains the query (case-insensitive)"""
+        if entities is not self._entities:
+            self._entities = entities
+            self._descriptors_lower = [entity["descriptor"].lower() for entity in entities]
+            self.cache.clear()
+        
+        query_lower = query.lower()
+        if query_lower in self.cache:
+            self.cache.move_to_end(query_lower)
+            return self.cache[query_lower]
+        
+        seed = self.get_seed(query_lower)
+        candidates = self.cache[seed] if seed is not None else range(len(entities))
+        hits = [idx for idx in candidates if query_lower in self._descriptors_lower[idx]]
+        
+        self.cache[query_lower] = hits
+        if len(self.cache) > self.capacity:
+            # Remove least recently used
+            self.cache.popitem(last=False)
+        return hits
+
+
+class SemanticResultCache:
+    """
+    Search results reused for near-duplicate queries.
+
+    A query whose normalized embedding has cosine >= min_similarity with a cached
+    query gets that query's result without scanning the entity matrix. This is
+    approximate by design (e.g. "John Smith" and "john smith" share a result), so
+    it is opt-in. Entries are bound to one (entity embeddings, threshold, top_k)
+    context and reset when it changes; the oldest entry is overwritten once the
+    ring buffer is full. Cached results are shared and must be treated as read-only.
+    """
+    
+    def __init__(self, capacity: int = 4096, min_similarity: float = 0.98):
+        self.capacity = capacity
+        self.min_similarity = min_similarity
+        self.vectors = None  # (capacity, D) unit query embeddings, allocated on first store
+        self.results = []
+        self.next_slot = 0
+        self.hits = 0
+        self.misses = 0
+        self._context = None
+    
+    def _bind(self, entity_embeddings, threshold: float, top_k: Optional[int]):
+        if (self._context is None or self._context[0] is not entity_embeddings
+                or self._context[1:] != (threshold, top_k)):
+            self._context = (entity_embeddings, threshold, top_k)
+            self.results = []
+            self.next_slot = 0
+    
+    def lookup(self, query_unit: np.ndarray, entity_embeddings, threshold: float, top_k: Optional[int] = None):
+        """Cached result of the closest earlier query if it is similar enough, else None"""
+        self._bind(entity_embeddings, threshold, top_k)
+        if self.results:
+            similarities = dot_scores(query_unit, self.vectors[:len(self.results)])
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.min_similarity:
+                self.hits += 1
+                return self.results[best]
+        self.misses += 1
+        return None
+    
+    def store(self, query_unit: np.ndarray, result):
+        """Remember a result for the context of the preceding lookup"""
+        if self.vectors is None or self.vectors.shape[1] != len(query_unit):
+            self.vectors = np.empty((self.capacity, len(query_unit)), dtype=np.float32)
+            self.results = []
+            self.next_slot = 0
+        self.vectors[self.next_slot] = query_unit
+        if self.next_slot < len(self.results):
+            self.results[self.next_slot] = result
+        else:
+            self.results.append(result)
+        self.next_slot = (self.next_slot + 1) % self.capacity
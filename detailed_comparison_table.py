@@ -1,24 +1,19 @@
-from entity_disambiguation import EntityDisambiguator
-from entity_disambiguation_hybrid import HybridEntityDisambiguator
+import disambiguator_registry
+from fixtures import entities_by_ids, cached_embeddings
 
 def main():
     # Initialize both disambiguators
     print("Loading models...")
-    original = EntityDisambiguator()
-    hybrid = HybridEntityDisambiguator()
+    original = disambiguator_registry.get("EntityDisambiguator")
+    hybrid = disambiguator_registry.get("HybridEntityDisambiguator")
     
-    # Test entities
-    entities = [
-        {"id": "1", "descriptor": "John Smith - Software Engineer at Google"},
-        {"id": "2", "descriptor": "John Smith - Professor of Physics at MIT"},
-        {"id": "3", "descriptor": "John Doe - Data Scientist at Microsoft"},
-        {"id": "4", "descriptor": "Jane Smith - Product Manager at Apple"},
-        {"id": "5", "descriptor": "Michael Johnson - Olympic Athlete"},
-    ]
+    # Test entities: the first five shared fixture entities
+    entity_ids = ("1", "2", "3", "4", "5")
+    entities = entities_by_ids(entity_ids)
     
-    # Create embeddings
-    original_embeddings = original.create_entity_embeddings(entities)
-    hybrid_embeddings = hybrid.create_entity_embeddings(entities)
+    # Create embeddings (cached per class and entity set)
+    original_embeddings = cached_embeddings("EntityDisambiguator", entity_ids)
+    hybrid_embeddings = cached_embeddings("HybridEntityDisambiguator", entity_ids)
     
     print("\n" + "="*120)
     print("DETAILED COMPARISON: Original vs Hybrid Approach")
@@ -0,0 +1,48 @@
+"""
+Process-wide registry of disambiguator instances.
+Scripts run in the same Python process (e.g. from a driver notebook) share
+one loaded POTION model, one query embedding cache per model and one instance
+per disambiguator class.
+"""
+
+from functools import lru_cache
+from model2vec import StaticModel
+
+from caching import QueryEmbeddingCache
+
+from entity_disambiguation import EntityDisambiguator
+from entity_disambiguation_hybrid import HybridEntityDisambiguator
+from entity_disambiguation_improved import ImprovedEntityDisambiguator
+
+
+DEFAULT_MODEL_NAME = "minishlab/potion-multilingual-128M"
+
+_CLASSES = {
+    cls.__name__: cls
+    for cls in (EntityDisambiguator, HybridEntityDisambiguator, ImprovedEntityDisambiguator)
+}
+
+
+@lru_cache(maxsize=None)
+def get_model(model_name: str = DEFAULT_MODEL_NAME) -> StaticModel:
+    """Load a static model once per process"""
+    return StaticModel.from_pretrained(model_name)
+
+
+@lru_cache(maxsize=None)
+def get_query_cache(model_name: str = DEFAULT_MODEL_NAME) -> QueryEmbeddingCache:
+    """Query embedding cache shared by every registry instance on a model (not thread-safe, see QueryEmbeddingCache)"""
+    return QueryEmbeddingCache(get_model(model_name).encode, model_name)
+
+
+def get(cls_name: str, model_name: str = DEFAULT_MODEL_NAME):
+    """Return the shared disambiguator instance for a class name, e.g. get("EntityDisambiguator")"""
+    if cls_name not in _CLASSES:
+        raise ValueError(f"Unknown disambiguator '{cls_name}'. Available: {', '.join(_CLASSES)}")
+    # Cache on positional args only, so get(name) and get(name, DEFAULT_MODEL_NAME) share an instance
+    return _get(cls_name, model_name)
+
+
+@lru_cache(maxsize=None)
+def _get(cls_name: str, model_name: str):
+    return _CLASSES[cls_name](model_name, model=get_model(model_name), query_cache=get_query_cache(model_name))
@@ -1,72 +1,225 @@
 import time
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 from model2vec import StaticModel
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from caching import QueryEmbeddingCache, PrefixCache, SemanticResultCache, load_or_encode
+from parallel_encoding import PARALLEL_ENCODE_MIN_TEXTS, encode_parallel
+from similarity import (FAISS_AVAILABLE, SIMSIMD_AVAILABLE, HNSWLIB_AVAILABLE, normalize_rows, normalize_vector,
+                        dot_scores, dot_matrix, ScoreBuffer, build_ip_index, ip_index_scores, ip_index_score_matrix,
+                        build_hnsw_index, hnsw_top_scores, quantize_rows, int8_dot_scores, top_k_positions)
+
+# Below this many entities the exact scan is fast enough and the HNSW index only costs recall
+ANN_MIN_ENTITIES = 1000
+# Nearest neighbours retrieved per query from the HNSW index
+ANN_CANDIDATES = 50
 
 
 class EntityDisambiguator:
-    def __init__(self, model_name: str = "minishlab/potion-multilingual-128M"):
+    def __init__(self, model_name: str = "minishlab/potion-multilingual-128M", model: StaticModel = None,
+                 use_faiss: bool = False, use_fp16: bool = False, use_int8: bool = False, use_ann: bool = False,
+                 query_cache_path: Optional[str] = None, use_semantic_cache: bool = False,
+                 embedding_cache_dir: Optional[str] = None, query_cache: Optional[QueryEmbeddingCache] = None):
         print(f"Loading model: {model_name}")
         start_time = time.time()
-        self.model = StaticModel.from_pretrained(model_name)
+        # Reuse an already-loaded model when given (see disambiguator_registry)
+        self.model = model if model is not None else StaticModel.from_pretrained(model_name)
+        self.model_name = model_name
         self.load_time = time.time() - start_time
         print(f"Model loaded in {self.load_time:.2f} seconds")
+        # Opt-in FAISS IndexFlatIP search (needs faiss); falls back to the dot-product kernel
+        self.use_faiss = use_faiss and FAISS_AVAILABLE
+        self._faiss_index = None  # (entity_embeddings, index) for the last matrix searched
+        # Opt-in float16 entity matrix: half the bytes per scan, scored by SimSIMD's f16 kernel
+        # (NumPy has no fast f16 GEMV, so this needs simsimd)
+        self.use_fp16 = use_fp16 and SIMSIMD_AVAILABLE
+        # Opt-in, approximate (scores within ~0.01): scan an int8 copy of the entity matrix with per-row scales,
+        # a quarter of the float32 bytes (needs simsimd for the integer dot-product kernel)
+        self.use_int8 = use_int8 and SIMSIMD_AVAILABLE
+        self._int8_index = None  # (entity_embeddings, quantized, scales) for the last matrix searched
+        # Opt-in approximate HNSW search (needs hnswlib) for large entity sets, see ANN_MIN_ENTITIES
+        self.use_ann = use_ann and HNSWLIB_AVAILABLE
+        self._ann_index = None  # (entity_embeddings, index) for the last matrix searched
+        # Repeated queries skip the encoder (per-instance LRU, optionally persisted across runs);
+        # disambiguators on the same model can pass one shared cache instead
+        self.query_cache = query_cache if query_cache is not None else \
+            QueryEmbeddingCache(self.model.encode, model_name, persist_path=query_cache_path)
+        # Similarity scores are written into a reused per-thread buffer instead of a fresh array
+        self.score_buffer = ScoreBuffer()
+        # Substring fallback narrows each query to the hits of its longest cached prefix
+        self.prefix_cache = PrefixCache()
+        # Opt-in, approximate: near-duplicate queries (cosine >= 0.98) reuse an earlier result
+        self.semantic_cache = SemanticResultCache() if use_semantic_cache else None
+        # Opt-in: entity encodings are saved here and reloaded for the same model and texts
+        self.embedding_cache_dir = embedding_cache_dir
         
-    def create_entity_embeddings(self, entities: List[Dict[str, str]]) -> np.ndarray:
-        """Create embeddings for entity descriptors"""
+    def _faiss(self, entity_embeddings: np.ndarray):
+        """FAISS inner-product index built once per entity embedding matrix"""
+        if self._faiss_index is None or self._faiss_index[0] is not entity_embeddings:
+            self._faiss_index = (entity_embeddings, build_ip_index(entity_embeddings))
+        return self._faiss_index[1]
+    
+    def _faiss_scores(self, query_embedding: np.ndarray, entity_embeddings: np.ndarray) -> np.ndarray:
+        """Score the query through the FAISS index of the entity embedding matrix"""
+        return ip_index_scores(self._faiss(entity_embeddings), query_embedding)
+    
+    def _int8_scores(self, query_embedding: np.ndarray, entity_embeddings: np.ndarray) -> np.ndarray:
+        """Score the query against an int8 copy quantized once per entity embedding matrix"""
+        if self._int8_index is None or self._int8_index[0] is not entity_embeddings:
+            self._int8_index = (entity_embeddings, *quantize_rows(entity_embeddings))
+        return int8_dot_scores(query_embedding, *self._int8_index[1:])
+    
+    def _ann(self, entity_embeddings: np.ndarray):
+        """HNSW index built once per entity embedding matrix"""
+        if self._ann_index is None or self._ann_index[0] is not entity_embeddings:
+            self._ann_index = (entity_embeddings, build_hnsw_index(entity_embeddings))
+        return self._ann_index[1]
+    
+    def _raw_encode(self, texts: List[str], parallel: bool = False) -> np.ndarray:
+        """Encode texts as a C-contiguous float32 matrix (shareable between disambiguators on one model)"""
+        if parallel and len(texts) >= PARALLEL_ENCODE_MIN_TEXTS:
+            return load_or_encode(lambda batch: encode_parallel(self.model_name, batch), texts,
+                                  self.model_name, self.embedding_cache_dir)
+        return load_or_encode(self.model.encode, texts, self.model_name, self.embedding_cache_dir)
+    
+    def build_index(self, raw_embeddings: np.ndarray, entities: List[Dict[str, str]]) -> np.ndarray:
+        """Build search embeddings from raw descriptor encodings"""
+        # Normalize once here so every search is a single dot product
+        unit_embeddings = normalize_rows(raw_embeddings)
+        if self.use_fp16:
+            return unit_embeddings.astype(np.float16)
+        return unit_embeddings
+    
+    def create_entity_embeddings(self, entities: List[Dict[str, str]], parallel: bool = False) -> np.ndarray:
+        """
+        Create L2-normalized float32 (or float16, see use_fp16) embeddings for entity descriptors.
+        With parallel=True, large entity sets (PARALLEL_ENCODE_MIN_TEXTS+) are encoded by a
+        process pool that loads the model by name in every worker.
+        """
         descriptors = [entity["descriptor"] for entity in entities]
-        return self.model.encode(descriptors)
+        return self.build_index(self._raw_encode(descriptors, parallel), entities)
     
     def search(self, query: str, entities: List[Dict[str, str]], 
-              entity_embeddings: np.ndarray, threshold: float = 0.5) -> List[Dict[str, str]]:
-        """Search for matching entities based on query"""
+              entity_embeddings: np.ndarray, threshold: float = 0.5,
+              top_k: Optional[int] = None) -> List[Dict[str, str]]:
+        """Search for matching entities based on query, returning at most top_k matches if given"""
         start_time = time.time()
         
-        # Encode the query
-        query_embedding = self.model.encode([query]).reshape(1, -1)
+        # Encode and normalize the query
+        query_embedding = normalize_vector(self.query_cache.encode(query))
         
-        # Calculate cosine similarities using sklearn
-        similarities = cosine_similarity(query_embedding, entity_embeddings)[0]
+        if self.semantic_cache is not None:
+            cached = self.semantic_cache.lookup(query_embedding, entity_embeddings, threshold, top_k)
+            if cached is not None:
+                return cached[0], time.time() - start_time, cached[2]
         
-        # Find matches above threshold
-        matches = []
-        for idx, (entity, similarity) in enumerate(zip(entities, similarities)):
-            if similarity >= threshold:
-                matches.append({
-                    **entity,
-                    "similarity": float(similarity),
-                    "rank": idx + 1
-                })
+        # Cosine similarity against the pre-normalized entity matrix
+        if self.use_ann and len(entity_embeddings) >= ANN_MIN_ENTITIES:
+            # Only the approximate nearest neighbours are scored
+            similarities = None
+            k = min(max(ANN_CANDIDATES, top_k or 0), len(entity_embeddings))
+            candidates, scores = hnsw_top_scores(self._ann(entity_embeddings), query_embedding, k)
+            # Back to entity order so tie-breaking matches the full scan
+            order = np.argsort(candidates)
+            candidates, scores = candidates[order], scores[order]
+            passing = scores >= threshold
+            candidates, scores = candidates[passing], scores[passing]
+        else:
+            if self.use_faiss:
+                similarities = self._faiss_scores(query_embedding, entity_embeddings)
+            elif self.use_int8:
+                similarities = self._int8_scores(query_embedding, entity_embeddings)
+            else:
+                similarities = dot_scores(query_embedding, entity_embeddings,
+                                          out=self.score_buffer.get(len(entity_embeddings)))
+            # Find matches above threshold
+            candidates = np.flatnonzero(similarities >= threshold)
+            scores = similarities[candidates]
         
-        # Sort by similarity
-        matches.sort(key=lambda x: x["similarity"], reverse=True)
+        result = self._resolve_matches(query, query_embedding, entities, entity_embeddings,
+                                       similarities, candidates, scores, top_k, start_time)
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(query_embedding, result)
+        return result
+    
+    def search_batch(self, queries: List[str], entities: List[Dict[str, str]],
+                     entity_embeddings: np.ndarray, threshold: float = 0.5,
+                     top_k: Optional[int] = None) -> List[Tuple[List[Dict[str, str]], float, str]]:
+        """search() for several queries: one encoder call and one (M, N) similarity matrix (always an exact scan)"""
+        if not queries:
+            return []
+        start_time = time.time()
+        query_embeddings = normalize_rows(self.query_cache.encode_batch(queries))
+        if self.use_faiss:
+            # One batched search over the flat index instead of one per query
+            similarity_matrix = ip_index_score_matrix(self._faiss(entity_embeddings), query_embeddings)
+        else:
+            similarity_matrix = dot_matrix(query_embeddings, entity_embeddings)
+        # Each query is charged an equal share of the batched encode + GEMM
+        shared_time = (time.time() - start_time) / max(len(queries), 1)
+        
+        results = []
+        for query, query_embedding, similarities in zip(queries, query_embeddings, similarity_matrix):
+            candidates = np.flatnonzero(similarities >= threshold)
+            results.append(self._resolve_matches(query, query_embedding, entities, entity_embeddings,
+                                                 similarities, candidates, similarities[candidates],
+                                                 top_k, time.time() - shared_time))
+        return results
+    
+    def _resolve_matches(self, query: str, query_embedding: np.ndarray, entities: List[Dict[str, str]],
+                         entity_embeddings: np.ndarray, similarities: Optional[np.ndarray],
+                         candidates: np.ndarray, scores: np.ndarray, top_k: Optional[int],
+                         start_time: float) -> Tuple[List[Dict[str, str]], float, str]:
+        """Rank the above-threshold candidates and classify the result (similarities is None on the ANN path)"""
+        num_matches = len(candidates)
+        if top_k is not None:
+            # O(N) partial selection instead of a full sort; keep at least two
+            # so the dominance check below still sees the runner-up
+            keep = max(top_k, 2)
+            if keep < num_matches:
+                selected = top_k_positions(scores, keep)
+                candidates, scores = candidates[selected], scores[selected]
+        
+        # Sort by similarity (stable, so ties keep entity order)
+        order = np.argsort(-scores, kind="stable")
+        candidates, scores = candidates[order], scores[order]
+        
+        # Classify on the sorted scores so result dicts are only built for what is returned
+        if num_matches > 0 and float(scores[0]) >= 0.85 and \
+           (num_matches == 1 or float(scores[0]) - float(scores[1]) > 0.1):
+            # Single high-confidence or dominant match
+            returned, match_type = 1, "exact"
+        else:
+            returned, match_type = top_k, "ambiguous"
+        
+        matches = []
+        for idx, score in zip(candidates[:returned], scores[:returned]):
+            # dict.copy() is cheaper than re-splatting every key
+            match = entities[idx].copy()
+            match["similarity"] = float(score)
+            match["rank"] = int(idx) + 1
+            matches.append(match)
         
         search_time = time.time() - start_time
         
-        # Check if we have a single high-confidence match
-        if len(matches) == 1 and matches[0]["similarity"] >= 0.85:
+        if match_type == "exact":
             return matches, search_time, "exact"
-        elif len(matches) > 0 and matches[0]["similarity"] >= 0.85 and (len(matches) == 1 or matches[0]["similarity"] - matches[1]["similarity"] > 0.1):
-            # Single dominant match
-            return [matches[0]], search_time, "exact"
         
         # If no semantic matches, fall back to substring matching
-        if not matches:
-            query_lower = query.lower()
+        if num_matches == 0:
+            # Hit positions come straight from the prefix cache; copies leave the caller's entities untouched
+            hit_indices = self.prefix_cache.matching_indices(query, entities)
+            if similarities is None:
+                # The ANN path only scored the nearest neighbours
+                hit_scores = dot_scores(query_embedding, entity_embeddings[hit_indices]) if hit_indices else []
+            else:
+                hit_scores = similarities[hit_indices]
             substring_matches = [
-                entity for entity in entities 
-                if query_lower in entity["descriptor"].lower()
+                dict(entities[idx], similarity=float(score))
+                for idx, score in zip(hit_indices, hit_scores)
             ]
+            substring_matches.sort(key=lambda x: x["similarity"], reverse=True)
             
-            # Calculate similarities for substring matches
-            for match in substring_matches:
-                idx = entities.index(match)
-                match["similarity"] = float(similarities[idx])
-            
-            substring_matches.sort(key=lambda x: x.get("similarity", 0), reverse=True)
-            
-            return substring_matches, search_time, "ambiguous"
+            return substring_matches[:top_k], search_time, "ambiguous"
         
         return matches, search_time, "ambiguous"
 
@@ -78,15 +231,24 @@ def evaluate_performance(disambiguator: EntityDisambiguator, test_cases: List[Di
     correct_ambiguous = 0
     total_search_time = 0
     
-    for test_case in test_cases:
-        query = test_case["query"]
+    # Test cases sharing an entity set are searched as one batch
+    batches = {}
+    for position, test_case in enumerate(test_cases):
+        batches.setdefault(id(test_case["entity_embeddings"]), []).append(position)
+    case_results = {}
+    for positions in batches.values():
+        first = test_cases[positions[0]]
+        batch_results = disambiguator.search_batch(
+            [test_cases[position]["query"] for position in positions],
+            first["entities"], first["entity_embeddings"]
+        )
+        case_results.update(zip(positions, batch_results))
+    
+    for position, test_case in enumerate(test_cases):
         expected_type = test_case["expected_type"]
         expected_ids = test_case["expected_ids"]
         
-        start = time.time()
-        results, search_time, result_type = disambiguator.search(
-            query, test_case["entities"], test_case["entity_embeddings"]
-        )
+        results, search_time, result_type = case_results[position]
         total_search_time += search_time
         
         result_ids = [r["id"] for r in results]
@@ -1,7 +1,9 @@
+import importlib.util
 import time
-from typing import List, Dict, Tuple, Union
+from typing import List, Dict, Tuple, Union, Optional
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from similarity import normalize_rows, normalize_vector, dot_scores, ScoreBuffer
+from caching import QueryEmbeddingCache, load_or_encode
 
 # Try to import both model types
 try:
@@ -11,11 +13,13 @@ except ImportError:
     STATICMODEL_AVAILABLE = False
     print("Warning: model2vec not available")
 
+# sentence-transformers pulls in torch (seconds to import), so only check it is installed
+# here and import it when a sentence-transformer model is actually loaded
 try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCETRANSFORMER_AVAILABLE = True
-except ImportError:
+    SENTENCETRANSFORMER_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+except (ImportError, ValueError):
     SENTENCETRANSFORMER_AVAILABLE = False
+if not SENTENCETRANSFORMER_AVAILABLE:
     print("Warning: sentence-transformers not available")
 
 
@@ -23,13 +27,14 @@ class FlexibleEntityDisambiguator:
     """Entity disambiguator that can use either StaticModel or SentenceTransformer"""
     
     def __init__(self, model_name: str = "minishlab/potion-multilingual-128M", 
-                 model_type: str = "auto"):
+                 model_type: str = "auto", embedding_cache_dir: Optional[str] = None):
         """
         Initialize with specified model.
         
         Args:
             model_name: Model identifier
             model_type: "static", "sentence-transformer", or "auto"
+            embedding_cache_dir: Optional directory for persisted entity embeddings (see caching.load_or_encode)
         """
         self.model_name = model_name
         self.model_type = model_type
@@ -48,6 +53,7 @@ class FlexibleEntityDisambiguator:
             self.model = StaticModel.from_pretrained(model_name)
             self.model_type_loaded = "static"
         elif model_type == "sentence-transformer" and SENTENCETRANSFORMER_AVAILABLE:
+            from sentence_transformers import SentenceTransformer
             self.model = SentenceTransformer(model_name)
             self.model_type_loaded = "sentence-transformer"
         else:
@@ -55,6 +61,11 @@ class FlexibleEntityDisambiguator:
         
         self.load_time = time.time() - start_time
         print(f"Model loaded in {self.load_time:.2f} seconds (type: {self.model_type_loaded})")
+        # Repeated queries skip the encoder (per-instance LRU, see caching.QueryEmbeddingCache)
+        self.query_cache = QueryEmbeddingCache(self.encode, model_name)
+        # Similarity scores are written into a reused per-thread buffer instead of a fresh array
+        self.score_buffer = ScoreBuffer()
+        self.embedding_cache_dir = embedding_cache_dir
     
     def encode(self, texts: Union[List[str], str]) -> np.ndarray:
         """Encode texts using the loaded model"""
@@ -66,10 +77,19 @@ class FlexibleEntityDisambiguator:
         else:  # sentence-transformer
             return self.model.encode(texts, convert_to_numpy=True)
     
+    def encode_batch(self, queries: List[str]) -> np.ndarray:
+        """Encode many queries in a single model call, returning an (N, D) float32 array"""
+        return np.ascontiguousarray(self.encode(list(queries)), dtype=np.float32)
+    
+    def encode_entity_texts(self, texts: List[str]) -> np.ndarray:
+        """Encode entity texts as a float32 matrix, loaded from embedding_cache_dir when saved by an earlier run"""
+        return load_or_encode(self.encode, texts, self.model_name, self.embedding_cache_dir)
+    
     def create_entity_embeddings(self, entities: List[Dict[str, str]]) -> np.ndarray:
-        """Create embeddings for entity descriptors"""
+        """Create L2-normalized float32 embeddings for entity descriptors"""
         descriptors = [entity["descriptor"] for entity in entities]
-        return self.encode(descriptors)
+        # Normalize once here so every search is a single dot product
+        return normalize_rows(self.encode_entity_texts(descriptors))
     
     def search(self, query: str, entities: List[Dict[str, str]], 
               entity_embeddings: np.ndarray, threshold: float = 0.5) -> Tuple[List[Dict[str, str]], float, str]:
@@ -77,10 +97,22 @@ class FlexibleEntityDisambiguator:
         start_time = time.time()
         
         # Encode the query
-        query_embedding = self.encode([query]).reshape(1, -1)
+        query_embedding = self.query_cache.encode(query)
+        
+        matches, _, match_type = self.search_with_embedding(
+            query, query_embedding, entities, entity_embeddings, threshold
+        )
+        return matches, time.time() - start_time, match_type
+    
+    def search_with_embedding(self, query: str, query_embedding: np.ndarray, entities: List[Dict[str, str]],
+                              entity_embeddings: np.ndarray, threshold: float = 0.5) -> Tuple[List[Dict[str, str]], float, str]:
+        """Search using a precomputed query embedding (e.g. from encode_batch)"""
+        start_time = time.time()
+        query_embedding = normalize_vector(query_embedding)
         
-        # Calculate cosine similarities
-        similarities = cosine_similarity(query_embedding, entity_embeddings)[0]
+        # Cosine similarity against the pre-normalized entity matrix
+        similarities = dot_scores(query_embedding, entity_embeddings,
+                                  out=self.score_buffer.get(len(entity_embeddings)))
         
         # Find matches above threshold
         matches = []
@@ -1,30 +1,63 @@
+import heapq
 import time
-from typing import List, Dict, Tuple
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Dict, Tuple, Optional
 from model2vec import StaticModel
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import re
-from difflib import SequenceMatcher
+from caching import QueryEmbeddingCache, load_or_encode
+from parallel_encoding import PARALLEL_ENCODE_MIN_TEXTS, encode_parallel
+from similarity import (RAPIDFUZZ_AVAILABLE, NAME_HIT_NONE, NAME_HIT_FIRST, NAME_HIT_MIDDLE, NAME_HIT_LAST,
+                        normalize_rows, normalize_vector, dot_scores, fuzzy_ratio, fuzzy_scores, build_token_hits,
+                        token_hit_scores, stack_max_scores)
+
+# Descriptors/queries whose parsed name parts are kept (see extract_name_parts)
+NAME_PARTS_CACHE_SIZE = 8192
+# match_type of partial-name results per token_hit_scores hit kind
+INITIAL_MATCH_TYPES = {NAME_HIT_NONE: "", NAME_HIT_FIRST: "first_initial",
+                       NAME_HIT_MIDDLE: "middle_initial", NAME_HIT_LAST: "last_initial"}
+NAME_MATCH_TYPES = {NAME_HIT_NONE: "semantic_name", NAME_HIT_FIRST: "exact_first_name",
+                    NAME_HIT_MIDDLE: "exact_name_part", NAME_HIT_LAST: "exact_last_name"}
 
 
 class ImprovedEntityDisambiguator:
-    def __init__(self, model_name: str = "minishlab/potion-multilingual-128M"):
+    # Descriptor separators, compiled once for all instances
+    name_split_pattern = re.compile(r' - | at | of ')
+    
+    def __init__(self, model_name: str = "minishlab/potion-multilingual-128M", model: StaticModel = None,
+                 use_rapidfuzz: bool = True, embedding_cache_dir: Optional[str] = None,
+                 query_cache: Optional[QueryEmbeddingCache] = None):
         print(f"Loading model: {model_name}")
         start_time = time.time()
-        self.model = StaticModel.from_pretrained(model_name)
+        # Reuse an already-loaded model when given (see disambiguator_registry)
+        self.model = model if model is not None else StaticModel.from_pretrained(model_name)
+        self.model_name = model_name
         self.load_time = time.time() - start_time
         print(f"Model loaded in {self.load_time:.2f} seconds")
+        # Batch C++ fuzzy scoring when rapidfuzz is installed, difflib otherwise
+        self.use_rapidfuzz = use_rapidfuzz and RAPIDFUZZ_AVAILABLE
+        # Repeated queries skip the encoder (per-instance LRU, see caching.QueryEmbeddingCache);
+        # disambiguators on the same model can pass one shared cache instead
+        self.query_cache = query_cache if query_cache is not None else QueryEmbeddingCache(self.model.encode, model_name)
+        # Opt-in: entity encodings are saved here and reloaded for the same model and texts
+        self.embedding_cache_dir = embedding_cache_dir
+        # Parsed name parts memoized per descriptor/query string; the cached dicts are
+        # shared between calls and must be treated as read-only
+        self.extract_name_parts = lru_cache(maxsize=NAME_PARTS_CACHE_SIZE)(self.extract_name_parts)
         
     def preprocess_text(self, text: str) -> str:
         """Normalize text for better matching"""
-        normalized = text.lower()
-        normalized = ' '.join(normalized.split())
-        return normalized
+        return ' '.join(text.lower().split())
+    
+    def preprocess_texts(self, texts: List[str]) -> List[str]:
+        """preprocess_text over many texts in one comprehension, without a method call per text"""
+        return [' '.join(text.split()) for text in map(str.lower, texts)]
     
     def extract_name(self, descriptor: str) -> str:
         """Extract the name part from a descriptor"""
-        parts = re.split(r' - | at | of ', descriptor)
-        return parts[0].strip()
+        # Only the part before the first separator is needed
+        return self.name_split_pattern.split(descriptor, maxsplit=1)[0].strip()
     
     def extract_name_parts(self, descriptor: str) -> Dict[str, str]:
         """Extract first, last, and full name from descriptor"""
@@ -34,69 +67,78 @@ class ImprovedEntityDisambiguator:
         # Extract middle names/initials
         middle_parts = parts[1:-1] if len(parts) > 2 else []
         
+        # Lowercased copies so matching never re-lowercases per query
+        parts_lower = [p.lower() for p in parts]
+        
+        full_lower = full_name.lower()
+        first_lower = parts_lower[0] if parts else ""
+        last_lower = parts_lower[-1] if len(parts) > 1 else ""
+        middle_lower = parts_lower[1:-1] if len(parts) > 2 else []
+        middle_initials = [p[0].upper() for p in middle_parts if p]
+        
         return {
             "full": full_name,
             "first": parts[0] if parts else "",
             "last": parts[-1] if len(parts) > 1 else "",
             "middle": middle_parts,
             "parts": parts,
+            "full_lower": full_lower,
+            "first_lower": first_lower,
+            "last_lower": last_lower,
+            "middle_lower": middle_lower,
+            "middle_initials": middle_initials,
+            # Everything check_name_match_with_initials compares, as one tuple
+            "match_key": (full_lower, first_lower, last_lower, len(parts), tuple(middle_lower),
+                          tuple(middle_initials), all(len(m) == 2 and m.endswith('.') for m in middle_lower)),
             "initials": [p[0].upper() for p in parts if p]  # First letter of each part
         }
     
     def fuzzy_match_score(self, s1: str, s2: str) -> float:
         """Calculate fuzzy string matching score"""
-        return SequenceMatcher(None, s1.lower(), s2.lower()).ratio()
+        return fuzzy_ratio(s1, s2, self.use_rapidfuzz)
     
     def check_name_match_with_initials(self, query_parts: Dict[str, str], entity_parts: Dict[str, str]) -> Tuple[bool, float, str]:
         """
         Check if names match considering middle names and initials.
         Returns (is_match, score, match_type)
         """
-        query_tokens = query_parts["parts"]
-        entity_tokens = entity_parts["parts"]
+        # Precomputed (full, first, last, num_parts, middle, middle_initials, middle_is_initials) tuples
+        query_full, query_first, query_last, query_len, query_middle, query_initials, query_has_initials = query_parts["match_key"]
+        entity_full, entity_first, entity_last, entity_len, entity_middle, entity_initials, entity_has_initials = entity_parts["match_key"]
         
         # Exact full name match
-        if query_parts["full"].lower() == entity_parts["full"].lower():
+        if query_full == entity_full:
             return True, 1.0, "exact_full_name"
         
-        # If query has 2+ parts, check for name matching with/without middle names
-        if len(query_tokens) >= 2:
-            query_first = query_tokens[0].lower()
-            query_last = query_tokens[-1].lower()
-            entity_first = entity_parts["first"].lower()
-            entity_last = entity_parts["last"].lower()
-            
-            # Check first and last name match
-            if query_first == entity_first and query_last == entity_last:
-                if len(query_tokens) == 2 and len(entity_tokens) > 2:
-                    # Query is "John Smith", entity is "John Michael Smith"
-                    return True, 0.95, "name_without_middle"
-                elif len(query_tokens) > 2:
-                    # Check middle names/initials
-                    query_middle = [m.lower() for m in query_tokens[1:-1]]
-                    entity_middle = [m.lower() for m in entity_parts["middle"]]
-                    
-                    # Check if middle names match exactly
-                    if query_middle == entity_middle:
-                        return True, 0.98, "name_with_middle"
-                    
-                    # Check if query has initials that match entity middle names
-                    if all(len(qm) == 2 and qm.endswith('.') for qm in query_middle):
-                        # Query has initials like "M."
-                        query_initials = [qm[0].upper() for qm in query_middle]
-                        entity_middle_initials = [em[0].upper() for em in entity_middle]
-                        if query_initials == entity_middle_initials:
-                            return True, 0.96, "name_with_middle_initial"
-                    
-                    # Check if entity has initials that match query middle names
-                    if all(len(em) == 2 and em.endswith('.') for em in entity_middle):
-                        entity_initials = [em[0].upper() for em in entity_middle]
-                        query_middle_initials = [qm[0].upper() for qm in query_middle]
-                        if entity_initials == query_middle_initials:
-                            return True, 0.96, "name_matches_middle_initial"
+        # Needs 2+ query parts and the same first and last name; anything else is a miss
+        if query_len < 2 or query_first != entity_first or query_last != entity_last:
+            return False, 0.0, ""
+        
+        if query_len == 2:
+            # Query is "John Smith", entity is "John Michael Smith"
+            if entity_len > 2:
+                return True, 0.95, "name_without_middle"
+            return False, 0.0, ""
+        
+        # Check if middle names match exactly
+        if query_middle == entity_middle:
+            return True, 0.98, "name_with_middle"
+        
+        # Check if middle initials match, with initials like "M." on either side
+        if query_initials == entity_initials:
+            if query_has_initials:
+                return True, 0.96, "name_with_middle_initial"
+            if entity_has_initials:
+                return True, 0.96, "name_matches_middle_initial"
         
         return False, 0.0, ""
     
+    def rank_matches(self, matches: List[Dict[str, any]], top_k: Optional[int] = None) -> List[Dict[str, any]]:
+        """Matches by descending similarity (ties keep their order); with top_k, only the best top_k via a heap"""
+        if top_k is None:
+            return sorted(matches, key=itemgetter("similarity"), reverse=True)
+        return heapq.nlargest(top_k, matches, key=itemgetter("similarity"))
+    
     def detect_query_type(self, query: str) -> str:
         """Detect if query is likely a first name, last name, full name, or semantic"""
         words = query.split()
@@ -111,8 +153,62 @@ class ImprovedEntityDisambiguator:
             # Multiple words or contains non-name words
             return "semantic"
     
-    def create_entity_embeddings(self, entities: List[Dict[str, str]]) -> Dict[str, any]:
-        """Create embeddings for entity descriptors with name parts"""
+    def _raw_encode(self, texts: List[str], parallel: bool = False) -> np.ndarray:
+        """Encode texts as a C-contiguous float32 matrix (shareable between disambiguators on one model)"""
+        if parallel and len(texts) >= PARALLEL_ENCODE_MIN_TEXTS:
+            return load_or_encode(lambda batch: encode_parallel(self.model_name, batch), texts,
+                                  self.model_name, self.embedding_cache_dir)
+        return load_or_encode(self.model.encode, texts, self.model_name, self.embedding_cache_dir)
+    
+    def entity_name_parts(self, entity_embeddings: Dict[str, any], idx: int) -> Dict[str, any]:
+        """Name parts of entity idx, re-derived from its stored full name (memoized like query name parts)"""
+        return self.extract_name_parts(entity_embeddings["full_names"][idx])
+    
+    def build_exact_index(self, descriptors: List[str], entity_names: List[Dict[str, any]]) -> Dict[str, Dict]:
+        """Lookups from lowercased descriptor, full name and (first, last) name to the entities carrying them"""
+        exact_index, full_name_index, first_last_index = {}, {}, {}
+        for idx, (descriptor, name_parts) in enumerate(zip(descriptors, entity_names)):
+            exact_index.setdefault(descriptor.lower(), []).append(idx)
+            full_name_index.setdefault(name_parts["full_lower"], []).append(idx)
+            first_last_index.setdefault((name_parts["first_lower"], name_parts["last_lower"]), []).append(idx)
+        return {
+            "exact_index": exact_index,
+            "full_name_index": full_name_index,
+            "first_last_index": first_last_index,
+        }
+    
+    def build_name_token_index(self, entity_names: List[Dict[str, any]]) -> Dict[str, Dict]:
+        """
+        Inverted indexes for partial-name queries (see similarity.build_token_hits): lowercased name
+        token -> entities where it is the first/middle/last name, and initial -> entities by position.
+        Each entity contributes the highest-priority kind per token: first, last, then middle for name
+        tokens; first, middle, then last for initials (left to right).
+        """
+        token_kinds = []
+        initial_kinds = []
+        for name in entity_names:
+            kinds = {}
+            for token, kind in ([(name["first_lower"], NAME_HIT_FIRST), (name["last_lower"], NAME_HIT_LAST)] +
+                                [(token, NAME_HIT_MIDDLE) for token in name["middle_lower"]]):
+                if token:
+                    kinds.setdefault(token, kind)
+            token_kinds.append(kinds)
+            
+            initials = name["initials"]
+            kinds = {}
+            for initial, kind in ([(initials[0] if initials else "", NAME_HIT_FIRST)] +
+                                  [(initial, NAME_HIT_MIDDLE) for initial in name["middle_initials"]] +
+                                  [(initials[-1] if len(initials) > 1 else "", NAME_HIT_LAST)]):
+                if initial:
+                    kinds.setdefault(initial, kind)
+            initial_kinds.append(kinds)
+        return {
+            "name_token_index": build_token_hits(token_kinds),
+            "initial_index": build_token_hits(initial_kinds),
+        }
+    
+    def _text_variants(self, entities: List[Dict[str, str]]) -> Tuple[List[Dict[str, any]], List[str], List[List[str]]]:
+        """Name parts, descriptors and the five other text variants that get embedded"""
         # Extract all name components
         entity_names = []
         for entity in entities:
@@ -121,11 +217,11 @@ class ImprovedEntityDisambiguator:
         
         # Original descriptors
         descriptors = [entity["descriptor"] for entity in entities]
-        normalized_descriptors = [self.preprocess_text(desc) for desc in descriptors]
+        normalized_descriptors = self.preprocess_texts(descriptors)
         
         # Full names
         full_names = [name["full"] for name in entity_names]
-        normalized_names = [self.preprocess_text(name) for name in full_names]
+        normalized_names = self.preprocess_texts(full_names)
         
         # First names only
         first_names = [name["first"] for name in entity_names]
@@ -133,90 +229,120 @@ class ImprovedEntityDisambiguator:
         # Last names only
         last_names = [name["last"] if name["last"] else name["first"] for name in entity_names]
         
-        # Create embeddings
+        return entity_names, descriptors, [normalized_descriptors, full_names, normalized_names, first_names, last_names]
+    
+    def create_entity_embeddings(self, entities: List[Dict[str, str]], parallel: bool = False) -> Dict[str, any]:
+        """
+        Create embeddings for entity descriptors with name parts.
+        With parallel=True, large entity sets are encoded by a process pool (see parallel_encoding).
+        """
+        entity_names, descriptors, variants = self._text_variants(entities)
+        # One encoder call for all six variants (6N texts) instead of six
+        flat = self._raw_encode(descriptors + [text for variant in variants for text in variant], parallel)
+        return self._assemble_index(flat, entity_names, descriptors)
+    
+    def build_index(self, raw_embeddings: np.ndarray, entities: List[Dict[str, str]],
+                    parallel: bool = False) -> Dict[str, any]:
+        """Build all embedding variants, reusing raw descriptor encodings as the original one"""
+        entity_names, descriptors, variants = self._text_variants(entities)
+        # The five remaining variants are encoded in a single call
+        flat_variants = self._raw_encode([text for variant in variants for text in variant], parallel)
+        return self._assemble_index(np.vstack((raw_embeddings, flat_variants)), entity_names, descriptors)
+    
+    def _assemble_index(self, flat: np.ndarray, entity_names: List[Dict[str, any]],
+                        descriptors: List[str]) -> Dict[str, any]:
+        """Split the stacked (6N, D) encodings into the per-variant embedding dict"""
+        # Embeddings are static, so L2-normalize once here and score with plain dot products
+        unit = normalize_rows(flat)
+        original, normalized, names, normalized_names, first_names, last_names = np.split(unit, 6)
         embeddings = {
-            "original": self.model.encode(descriptors),
-            "normalized": self.model.encode(normalized_descriptors),
-            "names": self.model.encode(full_names),
-            "normalized_names": self.model.encode(normalized_names),
-            "first_names": self.model.encode(first_names),
-            "last_names": self.model.encode(last_names),
-            "name_parts": entity_names
+            "original": original,
+            "normalized": normalized,
+            "names": names,
+            "normalized_names": normalized_names,
+            "first_names": first_names,
+            "last_names": last_names,
+            # (3, N, D) view over original/normalized/names, scored in one pass per query (stack_max_scores)
+            "semantic_stack": unit[:3 * len(original)].reshape(3, len(original), -1),
+            # (2N, D) first names then last names, scored with one dot-product pass for partial names
+            "first_last_names": unit[4 * len(original):],
+            # Lowercased descriptor / full name / (first, last) -> entity indices, so exact matching is a dict lookup
+            **self.build_exact_index(descriptors, entity_names),
+            "full_names": [name["full"] for name in entity_names],
+            "full_names_lower": [name["full_lower"] for name in entity_names],
+            # Lengths of the lowercased full names, for the fuzzy length prefilter
+            "full_name_lengths": np.array([len(name["full_lower"]) for name in entity_names]),
+            # Name token / initial -> entity indices for the partial-name lookup
+            **self.build_name_token_index(entity_names)
         }
         
         return embeddings
     
     def search(self, query: str, entities: List[Dict[str, str]], 
-              entity_embeddings: Dict[str, any], threshold: float = 0.5) -> Tuple[List[Dict[str, str]], float, str]:
-        """Improved search with better partial name handling"""
+              entity_embeddings: Dict[str, any], threshold: float = 0.5,
+              top_k: Optional[int] = None) -> Tuple[List[Dict[str, str]], float, str]:
+        """Improved search with better partial name handling, returning at most top_k matches if given"""
         start_time = time.time()
         
         # Detect query type
         query_type = self.detect_query_type(query)
         query_normalized = self.preprocess_text(query)
         
+        query_lower = query.lower()
+        
         # For partial name queries (single word), use special handling
         if query_type == "partial_name":
             matches = []
             
-            for idx, entity in enumerate(entities):
-                name_parts = entity_embeddings["name_parts"][idx]
-                score = 0.0
-                match_type = ""
+            # Check if query is a single letter (potential initial)
+            if len(query) == 1:
+                # Entities with this initial come from one index lookup;
+                # earlier name parts win, as in a left-to-right scan of the initials
+                scores, kinds = token_hit_scores(entity_embeddings["initial_index"], query.upper(),
+                                                 (0.85, 0.80, 0.85), np.zeros(len(entities)))
                 
-                # Check if query is a single letter (potential initial)
-                if len(query) == 1:
-                    query_upper = query.upper()
-                    # Check against all initials in the name
-                    for i, initial in enumerate(name_parts["initials"]):
-                        if query_upper == initial:
-                            if i == 0:
-                                score = 0.85
-                                match_type = "first_initial"
-                            elif i == len(name_parts["initials"]) - 1:
-                                score = 0.85
-                                match_type = "last_initial"
-                            else:
-                                score = 0.80
-                                match_type = "middle_initial"
-                            break
-                # Check exact first name match
-                elif query.lower() == name_parts["first"].lower():
-                    score = 0.95
-                    match_type = "exact_first_name"
-                # Check exact last name match
-                elif query.lower() == name_parts["last"].lower():
-                    score = 0.95
-                    match_type = "exact_last_name"
-                # Check if query matches any name part exactly (for middle names)
-                elif any(query.lower() == part.lower() for part in name_parts["parts"]):
-                    score = 0.90
-                    match_type = "exact_name_part"
-                else:
-                    # Fall back to semantic similarity with first/last names
-                    query_emb = self.model.encode([query]).reshape(1, -1)
-                    
-                    # Check similarity with first name
-                    first_sim = cosine_similarity(query_emb, entity_embeddings["first_names"][idx].reshape(1, -1))[0][0]
-                    # Check similarity with last name
-                    last_sim = cosine_similarity(query_emb, entity_embeddings["last_names"][idx].reshape(1, -1))[0][0]
+                # Only entities above the threshold are turned into result dicts
+                for idx in np.flatnonzero(scores >= threshold):
+                    match_type = INITIAL_MATCH_TYPES[kinds[idx]]
+                    matches.append({
+                        **entities[idx],
+                        "similarity": float(scores[idx]),
+                        "match_type": match_type
+                    })
+            else:
+                # Semantic name scores are scaled by 0.7 (0.71 leaves room for float rounding),
+                # so above that threshold only exact token hits can match
+                if threshold <= 0.71:
+                    # Fall back to semantic similarity with first/last names: one SIMD dot-product pass
+                    # over the stacked first/last unit matrices (similarity.dot_scores)
+                    query_emb = normalize_vector(self.query_cache.encode(query))
+                    name_sims = dot_scores(query_emb, entity_embeddings["first_last_names"]).reshape(2, -1)
                     
                     # Take max but apply a stronger penalty for semantic matching on partial names
                     # This reduces false positives like "John" matching "Johnson" semantically
-                    score = max(first_sim, last_sim) * 0.7
-                    match_type = "semantic_name"
+                    semantic_scores = (name_sims.max(axis=0) * 0.7).astype(np.float64)
+                else:
+                    semantic_scores = np.zeros(len(entities))
+                
+                # Exact first/last/middle name token hits from one index lookup;
+                # everything else keeps its semantic score
+                scores, kinds = token_hit_scores(entity_embeddings["name_token_index"], query_lower,
+                                                 (0.95, 0.90, 0.95), semantic_scores)
                 
-                if score >= threshold:
+                # Only entities above the threshold are turned into result dicts
+                for idx in np.flatnonzero(scores >= threshold):
                     matches.append({
-                        **entity,
-                        "similarity": float(score),
-                        "match_type": match_type
+                        **entities[idx],
+                        "similarity": float(scores[idx]),
+                        "match_type": NAME_MATCH_TYPES[kinds[idx]]
                     })
             
-            matches.sort(key=lambda x: x["similarity"], reverse=True)
+            # Classified on all matches, before top_k truncation
+            match_type = "partial" if len(matches) > 1 else "exact"
+            matches = self.rank_matches(matches, top_k)
             search_time = time.time() - start_time
             
-            return matches, search_time, "partial" if len(matches) > 1 else "exact"
+            return matches, search_time, match_type
         
         # For full names and semantic queries, use hybrid approach
         else:
@@ -225,11 +351,17 @@ class ImprovedEntityDisambiguator:
             
             # Check for exact matches first, including middle name handling
             exact_matches = []
-            for idx, entity in enumerate(entities):
-                entity_parts = entity_embeddings["name_parts"][idx]
+            descriptor_hits = set(entity_embeddings["exact_index"].get(query_lower, ()))
+            # Only entities with the same full name, or the same first and last name, can match by name
+            name_hits = set(entity_embeddings["full_name_index"].get(query_parts["full_lower"], ()))
+            name_hits.update(entity_embeddings["first_last_index"].get(
+                (query_parts["first_lower"], query_parts["last_lower"]), ()))
+            for idx in sorted(descriptor_hits | name_hits):
+                entity = entities[idx]
+                entity_parts = self.entity_name_parts(entity_embeddings, idx)
                 
                 # Check exact descriptor match
-                if query.lower() == entity["descriptor"].lower():
+                if idx in descriptor_hits:
                     exact_matches.append({
                         **entity,
                         "similarity": 1.0,
@@ -248,79 +380,58 @@ class ImprovedEntityDisambiguator:
             
             if exact_matches:
                 # Sort by score to prioritize exact matches
-                exact_matches.sort(key=lambda x: x["similarity"], reverse=True)
+                exact_matches = self.rank_matches(exact_matches, top_k)
                 search_time = time.time() - start_time
                 return exact_matches, search_time, "exact"
             
-            # Check fuzzy matches for typos
-            fuzzy_matches = []
-            for idx, entity in enumerate(entities):
-                name_parts = entity_embeddings["name_parts"][idx]
-                fuzzy_score = self.fuzzy_match_score(query, name_parts["full"])
-                
-                if fuzzy_score >= 0.85:
-                    fuzzy_matches.append({
-                        **entity,
-                        "similarity": fuzzy_score * 0.95,  # Slightly reduce to prioritize exact
-                        "match_type": "fuzzy",
-                        "fuzzy_score": fuzzy_score
-                    })
+            # Check fuzzy matches for typos: per-entity fuzzy similarity, 0 below the 0.85 cutoff
+            all_fuzzy = fuzzy_scores(query, entity_embeddings["full_names_lower"], self.use_rapidfuzz, score_cutoff=0.85,
+                                     candidate_lengths=entity_embeddings["full_name_lengths"],
+                                     candidates_lowercased=True)
+            # Slightly reduce to prioritize exact
+            fuzzy_similarity = np.where(all_fuzzy >= 0.85, all_fuzzy * 0.95, 0.0)
+            
+            # Semantic search: original and normalized query in one encoder call (one text when they coincide)
+            query_original, query_norm = self.query_cache.encode_batch([query, query_normalized])
+            # Query rows paired with the stacked entity views: original, normalized, original vs names
+            query_units = normalize_rows(np.vstack((query_original, query_norm, query_original)))
             
-            # Semantic search
-            query_embeddings = {
-                "original": self.model.encode([query]).reshape(1, -1),
-                "normalized": self.model.encode([query_normalized]).reshape(1, -1)
-            }
+            # Best cosine of the three pairs per entity, in one fused pass over the unit-normalized stack
+            semantic_scores = stack_max_scores(entity_embeddings["semantic_stack"], query_units)
             
-            # Calculate similarities
-            all_similarities = {}
-            all_similarities["orig_orig"] = cosine_similarity(
-                query_embeddings["original"], 
-                entity_embeddings["original"]
-            )[0]
-            all_similarities["norm_norm"] = cosine_similarity(
-                query_embeddings["normalized"], 
-                entity_embeddings["normalized"]
-            )[0]
-            all_similarities["orig_names"] = cosine_similarity(
-                query_embeddings["original"], 
-                entity_embeddings["names"]
-            )[0]
+            # Use fuzzy score if available, otherwise semantic
+            final_scores = np.where(fuzzy_similarity > 0, fuzzy_similarity, semantic_scores)
             
-            # Combine scores
+            # Only entities above the threshold are turned into result dicts
             combined_scores = []
-            for idx, entity in enumerate(entities):
-                # Get max semantic similarity
-                semantic_score = max(
-                    all_similarities["orig_orig"][idx],
-                    all_similarities["norm_norm"][idx],
-                    all_similarities["orig_names"][idx]
-                )
-                
-                # Check if already in fuzzy matches
-                fuzzy_score = 0
-                for fm in fuzzy_matches:
-                    if fm["id"] == entity["id"]:
-                        fuzzy_score = fm["similarity"]
-                        break
-                
-                # Use fuzzy score if available, otherwise semantic
-                final_score = fuzzy_score if fuzzy_score > 0 else semantic_score
-                
-                if final_score >= threshold:
-                    combined_scores.append({
-                        **entity,
-                        "similarity": float(final_score),
-                        "semantic_score": float(semantic_score)
-                    })
+            for idx in np.flatnonzero(final_scores >= threshold):
+                combined_scores.append({
+                    **entities[idx],
+                    "similarity": float(final_scores[idx]),
+                    "semantic_score": float(semantic_scores[idx])
+                })
             
-            combined_scores.sort(key=lambda x: x["similarity"], reverse=True)
+            single_match = len(combined_scores) == 1
+            combined_scores = self.rank_matches(combined_scores, top_k)
             search_time = time.time() - start_time
             
-            if len(combined_scores) == 1 and combined_scores[0]["similarity"] >= 0.85:
+            if single_match and combined_scores[0]["similarity"] >= 0.85:
                 return combined_scores, search_time, "exact"
             
             return combined_scores, search_time, "ambiguous"
+    
+    def search_batch(self, queries: List[str], entities: List[Dict[str, str]],
+                     entity_embeddings: Dict[str, any], threshold: float = 0.5,
+                     top_k: Optional[int] = None) -> List[Tuple[List[Dict[str, str]], float, str]]:
+        """search() for several queries, with the original and normalized forms of a chunk of queries encoded in one call"""
+        results = []
+        # Chunks fit in the query cache, so every encode inside search() is a cache hit
+        step = max(1, self.query_cache.capacity // 2)
+        for start in range(0, len(queries), step):
+            chunk = queries[start:start + step]
+            self.query_cache.encode_batch(chunk + self.preprocess_texts(chunk))
+            results.extend(self.search(query, entities, entity_embeddings, threshold, top_k) for query in chunk)
+        return results
 
 
 if __name__ == "__main__":
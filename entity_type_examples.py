@@ -6,6 +6,7 @@ Shows the 70/30 split between reusable and custom code
 from typing import List, Dict, Tuple
 import re
 from abc import ABC, abstractmethod
+from similarity import fuzzy_ratio
 
 
 # ============================================================================
@@ -23,8 +24,7 @@ class BaseEntityHandler(ABC):
     # These methods are IDENTICAL for all entity types
     def fuzzy_match_score(self, s1: str, s2: str) -> float:
         """Calculate fuzzy string matching score - REUSABLE"""
-        from difflib import SequenceMatcher
-        return SequenceMatcher(None, s1.lower(), s2.lower()).ratio()
+        return fuzzy_ratio(s1, s2)
     
     def normalize_text(self, text: str) -> str:
         """Basic text normalization - REUSABLE"""
@@ -130,6 +130,9 @@ class StatusEntityHandler(BaseEntityHandler):
 class DepartmentEntityHandler(BaseEntityHandler):
     """Handler for organizational departments"""
     
+    # Descriptor separators, compiled once
+    split_pattern = re.compile(r' - | › ')
+    
     def __init__(self):
         super().__init__()
         self.abbreviations = {
@@ -140,6 +143,10 @@ class DepartmentEntityHandler(BaseEntityHandler):
             "bd": "business development",
             "pr": "public relations"
         }
+        # All abbreviations in one alternation so expansion is a single regex pass
+        self.abbreviation_pattern = re.compile(
+            r"\b(?:" + "|".join(re.escape(abbr) for abbr in self.abbreviations) + r")\b"
+        )
         
         self.hierarchy = {
             "engineering": ["frontend", "backend", "devops", "qa", "mobile"],
@@ -149,8 +156,7 @@ class DepartmentEntityHandler(BaseEntityHandler):
     
     def extract_parts(self, entity_descriptor: str) -> Dict:
         """Extract department hierarchy"""
-        parts = re.split(r' - | › ', entity_descriptor)
-        dept_name = parts[0].strip()
+        dept_name = self.split_pattern.split(entity_descriptor, maxsplit=1)[0].strip()
         
         # Find parent department
         parent = None
@@ -172,10 +178,7 @@ class DepartmentEntityHandler(BaseEntityHandler):
     
     def expand_abbreviations(self, text: str) -> str:
         """Expand department abbreviations"""
-        result = text.lower()
-        for abbr, full in self.abbreviations.items():
-            result = re.sub(f"\\b{abbr}\\b", full, result)
-        return result
+        return self.abbreviation_pattern.sub(lambda m: self.abbreviations[m.group(0)], text.lower())
     
     def get_exact_match_variations(self, query: str) -> List[str]:
         """Generate department variations"""
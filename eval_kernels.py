@@ -0,0 +1,100 @@
+"""
+Numeric kernels for evaluate_metrics: per-query confusion counts over integer-coded
+entity ids, as 64-bit masks for small entity sets, compiled with numba when installed
+and computed with NumPy otherwise.
+"""
+
+from typing import Dict, List, Tuple
+import numpy as np
+import similarity
+
+# Padding code for the ragged id rows
+NO_ID = -1
+# Id codes below this fit one uint64 mask per row (see id_masks)
+MASK_BITS = 64
+
+_confusion_counts_jit = None
+
+
+def encode_id_rows(id_lists: List[List[str]], codes: Dict[str, int]) -> np.ndarray:
+    """
+    (len(id_lists), max_len) int32 matrix of distinct id codes per row, padded with NO_ID.
+    Ids missing from codes are added to it with the next free code.
+    """
+    rows = [[codes.setdefault(entity_id, len(codes)) for entity_id in dict.fromkeys(ids)] for ids in id_lists]
+    matrix = np.full((len(rows), max((len(row) for row in rows), default=0)), NO_ID, dtype=np.int32)
+    for i, row in enumerate(rows):
+        matrix[i, :len(row)] = row
+    return matrix
+
+
+def id_masks(code_rows: np.ndarray) -> np.ndarray:
+    """One uint64 mask per row of an encode_id_rows matrix, bit c set for code c (codes must be < MASK_BITS)"""
+    valid = code_rows != NO_ID
+    bits = np.left_shift(np.uint64(1), np.where(valid, code_rows, 0).astype(np.uint64))
+    return np.bitwise_or.reduce(np.where(valid, bits, np.uint64(0)), axis=1)
+
+
+def _confusion_kernel():
+    """Numba tp/fp/fn kernel, compiled on first use (None without numba)"""
+    global _confusion_counts_jit
+    if _confusion_counts_jit is None and similarity.NUMBA_AVAILABLE:
+        numba = similarity._import_numba()
+        if numba is None:
+            return None
+        
+        @numba.njit(cache=True, parallel=True)
+        def confusion_counts_jit(predicted, expected):
+            n = predicted.shape[0]
+            tp = np.zeros(n, dtype=np.int32)
+            fp = np.zeros(n, dtype=np.int32)
+            fn = np.zeros(n, dtype=np.int32)
+            for i in numba.prange(n):
+                num_expected = 0
+                for k in range(expected.shape[1]):
+                    if expected[i, k] != NO_ID:
+                        num_expected += 1
+                for j in range(predicted.shape[1]):
+                    code = predicted[i, j]
+                    if code == NO_ID:
+                        continue
+                    hit = False
+                    for k in range(expected.shape[1]):
+                        if expected[i, k] == code:
+                            hit = True
+                            break
+                    if hit:
+                        tp[i] += 1
+                    else:
+                        fp[i] += 1
+                fn[i] = num_expected - tp[i]
+            return tp, fp, fn
+        
+        _confusion_counts_jit = confusion_counts_jit
+    return _confusion_counts_jit
+
+
+def confusion_counts(predicted: np.ndarray, expected: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-row (tp, fp, fn) int32 arrays for padded id-code matrices from encode_id_rows
+    (rows hold distinct codes, so these equal the set-based counts).
+    """
+    if (hasattr(np, "bitwise_count") and predicted.shape[0]
+            and max(predicted.max(initial=NO_ID), expected.max(initial=NO_ID)) < MASK_BITS):
+        # Up to 64 distinct ids: each row is one mask and the counts are popcounts
+        predicted_masks, expected_masks = id_masks(predicted), id_masks(expected)
+        tp = np.bitwise_count(predicted_masks & expected_masks).astype(np.int32)
+        fp = np.bitwise_count(predicted_masks & ~expected_masks).astype(np.int32)
+        fn = np.bitwise_count(expected_masks & ~predicted_masks).astype(np.int32)
+        return tp, fp, fn
+    
+    kernel = _confusion_kernel()
+    if kernel is not None:
+        return similarity.launch_kernel(kernel, predicted, expected)
+    
+    valid = predicted != NO_ID
+    hits = (predicted[:, :, None] == expected[:, None, :]).any(axis=2) & valid
+    tp = np.count_nonzero(hits, axis=1).astype(np.int32)
+    fp = (np.count_nonzero(valid, axis=1) - tp).astype(np.int32)
+    fn = (np.count_nonzero(expected != NO_ID, axis=1) - tp).astype(np.int32)
+    return tp, fp, fn
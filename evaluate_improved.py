@@ -1,10 +1,13 @@
 from entity_disambiguation import EntityDisambiguator
 from entity_disambiguation_hybrid import HybridEntityDisambiguator
 from entity_disambiguation_improved import ImprovedEntityDisambiguator
-from evaluate_metrics import evaluate_disambiguator
+from evaluate_metrics import DEFAULT_EVAL_SEARCH_CACHE_PATH, evaluate_disambiguator, format_metrics_table
+from fixtures import ENTITIES, TEST_CASES_IMPROVED
+from typing import Optional
+import argparse
 
 
-def main():
+def main(search_cache_path: Optional[str] = None):
     print("Evaluating Original vs Hybrid vs Improved approaches...")
     
     # Initialize all three
@@ -13,17 +16,7 @@ def main():
     improved = ImprovedEntityDisambiguator()
     
     # Define entities
-    entities = [
-        {"id": "1", "descriptor": "John Smith - Software Engineer at Google"},
-        {"id": "2", "descriptor": "John Smith - Professor of Physics at MIT"},
-        {"id": "3", "descriptor": "John Doe - Data Scientist at Microsoft"},
-        {"id": "4", "descriptor": "Jane Smith - Product Manager at Apple"},
-        {"id": "5", "descriptor": "Michael Johnson - Olympic Athlete"},
-        {"id": "6", "descriptor": "Michael Jordan - Basketball Player"},
-        {"id": "7", "descriptor": "Sarah Johnson - CEO of Tech Startup"},
-        {"id": "8", "descriptor": "John Williams - Composer"},
-        {"id": "9", "descriptor": "Robert Johnson - Blues Musician"},
-    ]
+    entities = ENTITIES
     
     # Create embeddings
     original_embeddings = original.create_entity_embeddings(entities)
@@ -31,66 +24,22 @@ def main():
     improved_embeddings = improved.create_entity_embeddings(entities)
     
     # Define test cases focusing on the problematic ones
-    test_cases = [
-        # Partial name queries - the main problem area
-        {
-            "query": "John",
-            "expected_ids": ["1", "2", "3", "8"],  # All Johns
-            "description": "First name only - should match all Johns",
-            "threshold": 0.5
-        },
-        {
-            "query": "Johnson",
-            "expected_ids": ["5", "7", "9"],  # All Johnsons
-            "description": "Last name only - should match all Johnsons",
-            "threshold": 0.5
-        },
-        {
-            "query": "Smith",
-            "expected_ids": ["1", "2", "4"],  # All Smiths
-            "description": "Last name only - should match all Smiths",
-            "threshold": 0.5
-        },
-        # Full name queries
-        {
-            "query": "John Smith",
-            "expected_ids": ["1", "2"],
-            "description": "Full name - should match both John Smiths",
-            "threshold": 0.5
-        },
-        {
-            "query": "Michael Johnson",
-            "expected_ids": ["5"],
-            "description": "Exact full name",
-            "threshold": 0.5
-        },
-        # Typo cases
-        {
-            "query": "Jhon Smith",
-            "expected_ids": ["1", "2"],
-            "description": "Typo - should match John Smiths",
-            "threshold": 0.5
-        },
-        # Semantic queries
-        {
-            "query": "Software Engineer Google",
-            "expected_ids": ["1"],
-            "description": "Semantic search",
-            "threshold": 0.5
-        },
-    ]
+    test_cases = TEST_CASES_IMPROVED
     
     # Evaluate all three approaches
     original_results = evaluate_disambiguator(
-        original, entities, original_embeddings, test_cases, "Original POTION"
+        original, entities, original_embeddings, test_cases, "Original POTION",
+        search_cache_path=search_cache_path
     )
     
     hybrid_results = evaluate_disambiguator(
-        hybrid, entities, hybrid_embeddings, test_cases, "Hybrid Approach"
+        hybrid, entities, hybrid_embeddings, test_cases, "Hybrid Approach",
+        search_cache_path=search_cache_path
     )
     
     improved_results = evaluate_disambiguator(
-        improved, entities, improved_embeddings, test_cases, "Improved Approach"
+        improved, entities, improved_embeddings, test_cases, "Improved Approach",
+        search_cache_path=search_cache_path
     )
     
     # Print comparison
@@ -99,39 +48,26 @@ def main():
     print("="*100)
     
     print("\nOVERALL METRICS:")
-    print(f"{'Approach':<20} {'Precision':<15} {'Recall':<15} {'F1 Score':<15}")
-    print("-"*65)
-    
-    for results in [original_results, hybrid_results, improved_results]:
-        print(f"{results['approach']:<20} "
-              f"{results['overall']['precision']:<15.3f} "
-              f"{results['overall']['recall']:<15.3f} "
-              f"{results['overall']['f1']:<15.3f}")
+    print(format_metrics_table([original_results, hybrid_results, improved_results], 'overall'))
     
     print("\nMACRO-AVERAGED METRICS:")
-    print(f"{'Approach':<20} {'Precision':<15} {'Recall':<15} {'F1 Score':<15}")
-    print("-"*65)
-    
-    for results in [original_results, hybrid_results, improved_results]:
-        print(f"{results['approach']:<20} "
-              f"{results['macro']['precision']:<15.3f} "
-              f"{results['macro']['recall']:<15.3f} "
-              f"{results['macro']['f1']:<15.3f}")
+    print(format_metrics_table([original_results, hybrid_results, improved_results], 'macro'))
     
     # Show per-query F1 scores for partial name queries
     print("\n" + "="*100)
     print("PARTIAL NAME QUERY PERFORMANCE (F1 Scores)")
     print("="*100)
     
-    print(f"\n{'Query':<15} {'Original':<15} {'Hybrid':<15} {'Improved':<15}")
-    print("-"*60)
+    lines = [f"\n{'Query':<15} {'Original':<15} {'Hybrid':<15} {'Improved':<15}", "-"*60]
     
     for i, test in enumerate(test_cases[:3]):  # First 3 are partial name queries
         orig_f1 = original_results['per_query'][i]['f1']
         hybrid_f1 = hybrid_results['per_query'][i]['f1']
         improved_f1 = improved_results['per_query'][i]['f1']
         
-        print(f"{test['query']:<15} {orig_f1:<15.3f} {hybrid_f1:<15.3f} {improved_f1:<15.3f}")
+        lines.append(f"{test['query']:<15} {orig_f1:<15.3f} {hybrid_f1:<15.3f} {improved_f1:<15.3f}")
+    
+    print("\n".join(lines))
     
     # Summary
     print("\n" + "="*100)
@@ -142,17 +78,22 @@ def main():
     hybrid_perfect = sum(1 for m in hybrid_results['per_query'] if m['f1'] == 1.0)
     improved_perfect = sum(1 for m in improved_results['per_query'] if m['f1'] == 1.0)
     
-    print(f"\nPerfect F1 scores (1.0):")
-    print(f"  Original: {orig_perfect}/{len(test_cases)}")
-    print(f"  Hybrid: {hybrid_perfect}/{len(test_cases)}")
-    print(f"  Improved: {improved_perfect}/{len(test_cases)}")
-    
-    print("\nKey Improvements in the Improved Approach:")
-    print("1. ✅ Handles partial name queries correctly (John → all Johns)")
-    print("2. ✅ Maintains high precision for exact matches")
-    print("3. ✅ Still handles typos well")
-    print("4. ✅ Preserves semantic search capabilities")
+    print("\n".join([
+        f"\nPerfect F1 scores (1.0):",
+        f"  Original: {orig_perfect}/{len(test_cases)}",
+        f"  Hybrid: {hybrid_perfect}/{len(test_cases)}",
+        f"  Improved: {improved_perfect}/{len(test_cases)}",
+        "\nKey Improvements in the Improved Approach:",
+        "1. ✅ Handles partial name queries correctly (John → all Johns)",
+        "2. ✅ Maintains high precision for exact matches",
+        "3. ✅ Still handles typos well",
+        "4. ✅ Preserves semantic search capabilities",
+    ]))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluate the original, hybrid and improved approaches")
+    parser.add_argument('--search-cache', action='store_true',
+                        help=f"reuse search results saved by earlier runs in {DEFAULT_EVAL_SEARCH_CACHE_PATH}")
+    args = parser.parse_args()
+    main(DEFAULT_EVAL_SEARCH_CACHE_PATH if args.search_cache else None)
\ No newline at end of file
@@ -1,74 +1,168 @@
+import argparse
+import hashlib
+import json
+import os
+import shelve
+from typing import Dict, Optional
 import numpy as np
 from entity_disambiguation import EntityDisambiguator
 from entity_disambiguation_hybrid import HybridEntityDisambiguator
-from sklearn.metrics import precision_score, recall_score, f1_score, classification_report
+from eval_kernels import NO_ID, encode_id_rows, confusion_counts
+from fixtures import ENTITIES, TEST_CASES_METRICS
 from collections import defaultdict
 
+# Opt-in shelve file for evaluate_disambiguator(search_cache_path=...); results are keyed on
+# approach name, query, threshold and entity set only, so clear it after changing a disambiguator
+DEFAULT_EVAL_SEARCH_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "potion", "eval_search")
 
-def evaluate_disambiguator(disambiguator, entities, entity_embeddings, test_cases, approach_name):
-    """Evaluate a disambiguator with precision, recall, and F1 scores"""
+
+def entities_digest(entities) -> str:
+    """sha1 of the entity list, stable across processes and scripts"""
+    return hashlib.sha1(json.dumps(entities, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def precompute_query_embeddings(disambiguator, test_cases) -> Dict[str, np.ndarray]:
+    """
+    Embeddings of all distinct test queries from a single encode_batch call, for
+    evaluate_disambiguator(query_embeddings=...) on disambiguators with search_with_embedding.
+    """
+    queries = list(dict.fromkeys(test["query"] for test in test_cases))
+    return dict(zip(queries, disambiguator.encode_batch(queries)))
+
+
+def _search_ids(disambiguator, query, entities, entity_embeddings, threshold, query_embedding=None):
+    """(predicted_ids, search_time, match_type) for a query; a precomputed query embedding skips the encoder"""
+    if query_embedding is None:
+        results, search_time, match_type = disambiguator.search(
+            query, entities, entity_embeddings, threshold=threshold
+        )
+    else:
+        results, search_time, match_type = disambiguator.search_with_embedding(
+            query, query_embedding, entities, entity_embeddings, threshold=threshold
+        )
+    return [r["id"] for r in results], search_time, match_type
+
+
+def _cached_search(disambiguator, query, entities, entity_embeddings, threshold, approach_name,
+                   search_cache, digest, query_embedding=None):
+    """_search_ids, from the shelve when an earlier run stored the result"""
+    if search_cache is None:
+        return _search_ids(disambiguator, query, entities, entity_embeddings, threshold, query_embedding)
     
-    # Collect predictions and ground truth
-    all_predictions = []
-    all_ground_truth = []
+    key = hashlib.sha1(f"{approach_name}|{query}|{threshold}|{digest}".encode("utf-8")).hexdigest()
+    if key not in search_cache:
+        search_cache[key] = _search_ids(disambiguator, query, entities, entity_embeddings, threshold,
+                                        query_embedding)
+    return search_cache[key]
+
+
+def evaluate_disambiguator(disambiguator, entities, entity_embeddings, test_cases, approach_name,
+                           search_cache_path: Optional[str] = None,
+                           query_embeddings: Optional[Dict[str, np.ndarray]] = None,
+                           use_search_batch: bool = False):
+    """
+    Evaluate a disambiguator with precision, recall, and F1 scores.
+    With search_cache_path, search results are stored in (and on re-runs read from) a shelve file.
+    With query_embeddings (see precompute_query_embeddings), queries are searched via
+    search_with_embedding instead of being encoded one by one.
+    With use_search_batch, the queries sharing a threshold go through one disambiguator.search_batch
+    call (one encoder call and one query x entity similarity matrix) instead of one search each.
+    """
+    search_cache = None
+    digest = None
+    if search_cache_path is not None:
+        os.makedirs(os.path.dirname(search_cache_path) or ".", exist_ok=True)
+        search_cache = shelve.open(search_cache_path)
+        digest = entities_digest(entities)
     
-    # Per-query metrics
-    query_metrics = []
+    # Per-query predicted ids and list sizes; confusion counts and precision/recall/F1 are derived after the loop
+    num_tests = len(test_cases)
+    predicted_id_lists = []
+    predicted_counts = np.zeros(num_tests, dtype=np.int32)
+    # Each distinct (query, threshold) is searched once; repeats share its (read-only) result
+    searched = {}
+    if use_search_batch and search_cache is None and query_embeddings is None:
+        queries_by_threshold = {}
+        for test in test_cases:
+            queries_by_threshold.setdefault(test.get("threshold", 0.5), {})[test["query"]] = None
+        for threshold, queries in queries_by_threshold.items():
+            batch_results = disambiguator.search_batch(list(queries), entities, entity_embeddings, threshold)
+            for query, (results, search_time, match_type) in zip(queries, batch_results):
+                searched[query, threshold] = [r["id"] for r in results], search_time, match_type
     
-    for test in test_cases:
+    for i, test in enumerate(test_cases):
         query = test["query"]
-        expected_ids = test["expected_ids"]
         threshold = test.get("threshold", 0.5)
         
         # Get predictions
-        results, search_time, match_type = disambiguator.search(
-            query, entities, entity_embeddings, threshold=threshold
-        )
-        
-        predicted_ids = [r["id"] for r in results]
-        
-        # Calculate per-query metrics
-        # True Positives: predicted IDs that are in expected IDs
-        tp = len(set(predicted_ids) & set(expected_ids))
-        # False Positives: predicted IDs that are not in expected IDs
-        fp = len(set(predicted_ids) - set(expected_ids))
-        # False Negatives: expected IDs that were not predicted
-        fn = len(set(expected_ids) - set(predicted_ids))
-        
-        # Per-query precision, recall, F1
-        precision = tp / (tp + fp) if (tp + fp) > 0 else 0
-        recall = tp / (tp + fn) if (tp + fn) > 0 else 0
-        f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-        
-        query_metrics.append({
-            "query": query,
-            "precision": precision,
-            "recall": recall,
-            "f1": f1,
-            "tp": tp,
-            "fp": fp,
-            "fn": fn,
-            "predicted": len(predicted_ids),
-            "expected": len(expected_ids)
-        })
-        
-        # For overall metrics, create binary labels for each entity
-        for entity in entities:
-            entity_id = entity["id"]
-            # Ground truth: 1 if entity should be returned, 0 otherwise
-            all_ground_truth.append(1 if entity_id in expected_ids else 0)
-            # Prediction: 1 if entity was returned, 0 otherwise
-            all_predictions.append(1 if entity_id in predicted_ids else 0)
+        if (query, threshold) not in searched:
+            searched[query, threshold] = _cached_search(
+                disambiguator, query, entities, entity_embeddings, threshold, approach_name, search_cache, digest,
+                query_embeddings[query] if query_embeddings is not None else None
+            )
+        predicted_ids, search_time, match_type = searched[query, threshold]
+        predicted_id_lists.append(predicted_ids)
+        predicted_counts[i] = len(predicted_ids)
+    
+    if search_cache is not None:
+        search_cache.close()
+    
+    # Entity ids as int32 codes (entity position; unknown ids get codes >= len(entities)),
+    # one padded row of distinct codes per query
+    id_codes = {entity["id"]: idx for idx, entity in enumerate(entities)}
+    predicted_codes = encode_id_rows(predicted_id_lists, id_codes)
+    expected_codes = encode_id_rows([test["expected_ids"] for test in test_cases], id_codes)
+    
+    # Per-query confusion counts:
+    # TP = predicted IDs that are in expected IDs, FP = predicted IDs that are not in expected IDs,
+    # FN = expected IDs that were not predicted
+    tp_counts, fp_counts, fn_counts = confusion_counts(predicted_codes, expected_codes)
+    
+    # For overall metrics, binary labels per (test case, entity):
+    # True if the entity should be / was returned
+    ground_truth_matrix = np.zeros((num_tests, len(entities)), dtype=np.bool_)
+    prediction_matrix = np.zeros((num_tests, len(entities)), dtype=np.bool_)
+    for label_matrix, code_matrix in ((ground_truth_matrix, expected_codes), (prediction_matrix, predicted_codes)):
+        rows, cols = np.nonzero((code_matrix != NO_ID) & (code_matrix < len(entities)))
+        label_matrix[rows, code_matrix[rows, cols]] = True
+    
+    # Calculate overall metrics from one pass of confusion counts over the flattened (test case, entity) labels
+    all_ground_truth = ground_truth_matrix.ravel()
+    all_predictions = prediction_matrix.ravel()
+    overall_tp = int(np.count_nonzero(all_predictions & all_ground_truth))
+    overall_fp = int(np.count_nonzero(all_predictions & ~all_ground_truth))
+    overall_fn = int(np.count_nonzero(~all_predictions & all_ground_truth))
+    overall_precision = overall_tp / (overall_tp + overall_fp) if (overall_tp + overall_fp) > 0 else 0.0
+    overall_recall = overall_tp / (overall_tp + overall_fn) if (overall_tp + overall_fn) > 0 else 0.0
+    overall_f1 = 2 * overall_tp / (2 * overall_tp + overall_fp + overall_fn) if overall_tp > 0 else 0.0
     
-    # Calculate overall metrics
-    overall_precision = precision_score(all_ground_truth, all_predictions, zero_division=0)
-    overall_recall = recall_score(all_ground_truth, all_predictions, zero_division=0)
-    overall_f1 = f1_score(all_ground_truth, all_predictions, zero_division=0)
+    # Per-query precision, recall, F1 for all queries at once (0 where undefined)
+    precisions = np.divide(tp_counts, tp_counts + fp_counts, out=np.zeros(num_tests),
+                           where=(tp_counts + fp_counts) > 0)
+    recalls = np.divide(tp_counts, tp_counts + fn_counts, out=np.zeros(num_tests),
+                        where=(tp_counts + fn_counts) > 0)
+    f1_scores = np.divide(2 * (precisions * recalls), precisions + recalls, out=np.zeros(num_tests),
+                          where=(precisions + recalls) > 0)
+    
+    query_metrics = [
+        {
+            "query": test["query"],
+            "precision": float(precisions[i]),
+            "recall": float(recalls[i]),
+            "f1": float(f1_scores[i]),
+            "tp": int(tp_counts[i]),
+            "fp": int(fp_counts[i]),
+            "fn": int(fn_counts[i]),
+            "predicted": int(predicted_counts[i]),
+            "expected": len(test["expected_ids"])
+        }
+        for i, test in enumerate(test_cases)
+    ]
     
     # Calculate macro-averaged metrics
-    macro_precision = np.mean([m["precision"] for m in query_metrics])
-    macro_recall = np.mean([m["recall"] for m in query_metrics])
-    macro_f1 = np.mean([m["f1"] for m in query_metrics])
+    macro_precision = precisions.mean()
+    macro_recall = recalls.mean()
+    macro_f1 = f1_scores.mean()
     
     return {
         "approach": approach_name,
@@ -86,126 +180,41 @@ def evaluate_disambiguator(disambiguator, entities, entity_embeddings, test_case
     }
 
 
-def main():
+def format_metrics_table(results_list, category: str) -> str:
+    """Header, rule and one row per approach for results[category] precision/recall/F1, as one string"""
+    lines = [f"{'Approach':<20} {'Precision':<15} {'Recall':<15} {'F1 Score':<15}", "-"*65]
+    lines.extend(f"{results['approach']:<20} "
+                 f"{results[category]['precision']:<15.3f} "
+                 f"{results[category]['recall']:<15.3f} "
+                 f"{results[category]['f1']:<15.3f}"
+                 for results in results_list)
+    return "\n".join(lines)
+
+
+def main(search_cache_path: Optional[str] = None):
     print("Loading models for evaluation...")
     original = EntityDisambiguator()
     hybrid = HybridEntityDisambiguator()
     
     # Define entities
-    entities = [
-        {"id": "1", "descriptor": "John Smith - Software Engineer at Google"},
-        {"id": "2", "descriptor": "John Smith - Professor of Physics at MIT"},
-        {"id": "3", "descriptor": "John Doe - Data Scientist at Microsoft"},
-        {"id": "4", "descriptor": "Jane Smith - Product Manager at Apple"},
-        {"id": "5", "descriptor": "Michael Johnson - Olympic Athlete"},
-        {"id": "6", "descriptor": "Michael Jordan - Basketball Player"},
-        {"id": "7", "descriptor": "Sarah Johnson - CEO of Tech Startup"},
-        {"id": "8", "descriptor": "John Williams - Composer"},
-        {"id": "9", "descriptor": "Robert Johnson - Blues Musician"},
-    ]
+    entities = ENTITIES
     
     # Create embeddings
     original_embeddings = original.create_entity_embeddings(entities)
     hybrid_embeddings = hybrid.create_entity_embeddings(entities)
     
     # Define test cases with ground truth
-    test_cases = [
-        # Exact match cases
-        {
-            "query": "John Smith",
-            "expected_ids": ["1", "2"],  # Both John Smiths
-            "description": "Exact name - should return both John Smiths",
-            "threshold": 0.5
-        },
-        {
-            "query": "Michael Johnson",
-            "expected_ids": ["5"],  # Only the Olympic athlete
-            "description": "Exact full name match",
-            "threshold": 0.5
-        },
-        {
-            "query": "Jane Smith",
-            "expected_ids": ["4"],
-            "description": "Exact match - Jane Smith",
-            "threshold": 0.5
-        },
-        
-        # Typo cases
-        {
-            "query": "Jhon Smith",
-            "expected_ids": ["1", "2"],  # Should still match both John Smiths
-            "description": "Typo - should handle and return John Smiths",
-            "threshold": 0.5
-        },
-        {
-            "query": "Micheal Johnson",
-            "expected_ids": ["5"],  # Should match Michael Johnson
-            "description": "Common misspelling",
-            "threshold": 0.5
-        },
-        
-        # Case variations
-        {
-            "query": "john smith",
-            "expected_ids": ["1", "2"],
-            "description": "Lowercase - should be case insensitive",
-            "threshold": 0.5
-        },
-        {
-            "query": "MICHAEL JOHNSON",
-            "expected_ids": ["5"],
-            "description": "Uppercase - should be case insensitive",
-            "threshold": 0.5
-        },
-        
-        # Partial matches
-        {
-            "query": "John",
-            "expected_ids": ["1", "2", "3", "8"],  # All Johns
-            "description": "First name only - should match all Johns",
-            "threshold": 0.4
-        },
-        {
-            "query": "Johnson",
-            "expected_ids": ["5", "7", "9"],  # All Johnsons
-            "description": "Last name only - should match all Johnsons",
-            "threshold": 0.4
-        },
-        {
-            "query": "Smith",
-            "expected_ids": ["1", "2", "4"],  # All Smiths
-            "description": "Last name only - should match all Smiths",
-            "threshold": 0.4
-        },
-        
-        # Semantic matches
-        {
-            "query": "Software Engineer Google",
-            "expected_ids": ["1"],  # John Smith at Google
-            "description": "Semantic search for role and company",
-            "threshold": 0.5
-        },
-        {
-            "query": "Olympic Athlete",
-            "expected_ids": ["5"],  # Michael Johnson
-            "description": "Semantic search for role",
-            "threshold": 0.5
-        },
-        {
-            "query": "CEO startup",
-            "expected_ids": ["7"],  # Sarah Johnson
-            "description": "Semantic search for role",
-            "threshold": 0.5
-        },
-    ]
+    test_cases = TEST_CASES_METRICS
     
     # Evaluate both approaches
     original_results = evaluate_disambiguator(
-        original, entities, original_embeddings, test_cases, "Original POTION"
+        original, entities, original_embeddings, test_cases, "Original POTION",
+        search_cache_path=search_cache_path
     )
     
     hybrid_results = evaluate_disambiguator(
-        hybrid, entities, hybrid_embeddings, test_cases, "Hybrid Approach"
+        hybrid, entities, hybrid_embeddings, test_cases, "Hybrid Approach",
+        search_cache_path=search_cache_path
     )
     
     # Print results
@@ -215,33 +224,19 @@ def main():
     
     # Overall metrics
     print("\nOVERALL METRICS (Binary classification across all entity-query pairs):")
-    print(f"{'Approach':<20} {'Precision':<15} {'Recall':<15} {'F1 Score':<15}")
-    print("-"*65)
-    
-    for results in [original_results, hybrid_results]:
-        print(f"{results['approach']:<20} "
-              f"{results['overall']['precision']:<15.3f} "
-              f"{results['overall']['recall']:<15.3f} "
-              f"{results['overall']['f1']:<15.3f}")
+    print(format_metrics_table([original_results, hybrid_results], 'overall'))
     
     # Macro-averaged metrics
     print("\nMACRO-AVERAGED METRICS (Average across queries):")
-    print(f"{'Approach':<20} {'Precision':<15} {'Recall':<15} {'F1 Score':<15}")
-    print("-"*65)
-    
-    for results in [original_results, hybrid_results]:
-        print(f"{results['approach']:<20} "
-              f"{results['macro']['precision']:<15.3f} "
-              f"{results['macro']['recall']:<15.3f} "
-              f"{results['macro']['f1']:<15.3f}")
+    print(format_metrics_table([original_results, hybrid_results], 'macro'))
     
     # Per-query comparison for interesting cases
     print("\n" + "="*80)
     print("PER-QUERY METRICS COMPARISON")
     print("="*80)
     
-    print(f"\n{'Query':<25} {'Metric':<10} {'Original':<15} {'Hybrid':<15} {'Improvement':<15}")
-    print("-"*80)
+    # Rows are collected and written with a single print
+    lines = [f"\n{'Query':<25} {'Metric':<10} {'Original':<15} {'Hybrid':<15} {'Improvement':<15}", "-"*80]
     
     for i, test in enumerate(test_cases[:8]):  # Show first 8 cases
         orig_metrics = original_results['per_query'][i]
@@ -250,17 +245,21 @@ def main():
         # F1 Score comparison
         f1_improvement = ((hybrid_metrics['f1'] - orig_metrics['f1']) / orig_metrics['f1'] * 100) if orig_metrics['f1'] > 0 else float('inf')
         
-        print(f"{test['query']:<25} {'F1':<10} {orig_metrics['f1']:<15.3f} {hybrid_metrics['f1']:<15.3f} "
-              f"{'+' + str(round(f1_improvement, 1)) + '%' if f1_improvement != float('inf') else '+∞':<15}")
+        lines.append(f"{test['query']:<25} {'F1':<10} {orig_metrics['f1']:<15.3f} {hybrid_metrics['f1']:<15.3f} "
+                     f"{'+' + str(round(f1_improvement, 1)) + '%' if f1_improvement != float('inf') else '+∞':<15}")
         
         # Show precision and recall details for cases with differences
         if abs(orig_metrics['f1'] - hybrid_metrics['f1']) > 0.1:
-            print(f"{'':<25} {'Precision':<10} {orig_metrics['precision']:<15.3f} {hybrid_metrics['precision']:<15.3f}")
-            print(f"{'':<25} {'Recall':<10} {orig_metrics['recall']:<15.3f} {hybrid_metrics['recall']:<15.3f}")
             orig_tp_fp_fn = f"{orig_metrics['tp']}/{orig_metrics['fp']}/{orig_metrics['fn']}"
             hybrid_tp_fp_fn = f"{hybrid_metrics['tp']}/{hybrid_metrics['fp']}/{hybrid_metrics['fn']}"
-            print(f"{'':<25} {'TP/FP/FN':<10} {orig_tp_fp_fn:<15} {hybrid_tp_fp_fn:<15}")
-            print()
+            lines += [
+                f"{'':<25} {'Precision':<10} {orig_metrics['precision']:<15.3f} {hybrid_metrics['precision']:<15.3f}",
+                f"{'':<25} {'Recall':<10} {orig_metrics['recall']:<15.3f} {hybrid_metrics['recall']:<15.3f}",
+                f"{'':<25} {'TP/FP/FN':<10} {orig_tp_fp_fn:<15} {hybrid_tp_fp_fn:<15}",
+                "",
+            ]
+    
+    print("\n".join(lines))
     
     # Summary improvements
     print("\n" + "="*80)
@@ -272,17 +271,22 @@ def main():
     macro_f1_improvement = ((hybrid_results['macro']['f1'] - original_results['macro']['f1']) / 
                            original_results['macro']['f1'] * 100)
     
-    print(f"\nOverall F1 Score Improvement: +{overall_f1_improvement:.1f}%")
-    print(f"Macro F1 Score Improvement: +{macro_f1_improvement:.1f}%")
-    
     # Count perfect scores
     perfect_original = sum(1 for m in original_results['per_query'] if m['f1'] == 1.0)
     perfect_hybrid = sum(1 for m in hybrid_results['per_query'] if m['f1'] == 1.0)
     
-    print(f"\nPerfect F1 scores (1.0):")
-    print(f"  Original: {perfect_original}/{len(test_cases)} queries")
-    print(f"  Hybrid: {perfect_hybrid}/{len(test_cases)} queries")
+    print("\n".join([
+        f"\nOverall F1 Score Improvement: +{overall_f1_improvement:.1f}%",
+        f"Macro F1 Score Improvement: +{macro_f1_improvement:.1f}%",
+        f"\nPerfect F1 scores (1.0):",
+        f"  Original: {perfect_original}/{len(test_cases)} queries",
+        f"  Hybrid: {perfect_hybrid}/{len(test_cases)} queries",
+    ]))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluate the original and hybrid approaches")
+    parser.add_argument('--search-cache', action='store_true',
+                        help=f"reuse search results saved by earlier runs in {DEFAULT_EVAL_SEARCH_CACHE_PATH}")
+    args = parser.parse_args()
+    main(DEFAULT_EVAL_SEARCH_CACHE_PATH if args.search_cache else None)
\ No newline at end of file
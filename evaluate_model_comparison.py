@@ -1,179 +1,90 @@
 from entity_disambiguation_flexible import FlexibleEntityDisambiguator
 from entity_disambiguation_improved_flexible import ImprovedFlexibleEntityDisambiguator
-from evaluate_metrics import evaluate_disambiguator
+from caching import DEFAULT_EMBEDDING_CACHE_DIR
+from evaluate_metrics import DEFAULT_EVAL_SEARCH_CACHE_PATH, evaluate_disambiguator, precompute_query_embeddings
+from fixtures import ENTITIES_EXTENDED, TEST_CASES_EXTENDED
 from tabulate import tabulate
 import numpy as np
-import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+import argparse
+import timeit
 
+# Model families: display name, model id, model type
+MODEL_FAMILIES = {
+    'potion': ("POTION", "minishlab/potion-multilingual-128M", "static"),
+    'minilm': ("MiniLM", "sentence-transformers/all-MiniLM-L6-v2", "sentence-transformer"),
+}
 
-def run_model_comparison():
-    """Compare POTION vs MiniLM for both baseline and improved approaches"""
+
+def run_model_comparison(families: Tuple[str, ...] = ('potion', 'minilm'), search_cache_path: Optional[str] = None):
+    """
+    Compare POTION vs MiniLM for both baseline and improved approaches (only the given model families are loaded).
+    With search_cache_path, search results are reused across runs (see evaluate_disambiguator).
+    """
     
     print("COMPARING POTION vs MiniLM MODELS")
     print("="*100)
     
     # Extended entities with middle names
-    entities = [
-        {"id": "1", "descriptor": "John Smith - Software Engineer at Google"},
-        {"id": "2", "descriptor": "John Michael Smith - Professor of Physics at MIT"},
-        {"id": "3", "descriptor": "John M. Smith - Data Scientist at Facebook"},
-        {"id": "4", "descriptor": "John Doe - Data Scientist at Microsoft"},
-        {"id": "5", "descriptor": "Jane Smith - Product Manager at Apple"},
-        {"id": "6", "descriptor": "Jane Marie Smith - Designer at Adobe"},
-        {"id": "7", "descriptor": "Michael Johnson - Olympic Athlete"},
-        {"id": "8", "descriptor": "Michael J. Johnson - Basketball Player"},
-        {"id": "9", "descriptor": "Sarah Johnson - CEO of Tech Startup"},
-        {"id": "10", "descriptor": "John Williams - Composer"},
-        {"id": "11", "descriptor": "Robert Johnson - Blues Musician"},
-        {"id": "12", "descriptor": "Mary Jane Watson - Journalist"},
-        {"id": "13", "descriptor": "J. Paul Jones - Musician"},
-    ]
+    entities = ENTITIES_EXTENDED
     
     # Comprehensive test cases
-    test_cases = [
-        # Partial name queries
-        {
-            "query": "John",
-            "expected_ids": ["1", "2", "3", "4", "10", "13"],
-            "description": "First name only",
-            "threshold": 0.5
-        },
-        {
-            "query": "Johnson",
-            "expected_ids": ["7", "8", "9", "11"],
-            "description": "Last name only",
-            "threshold": 0.5
-        },
-        {
-            "query": "Smith",
-            "expected_ids": ["1", "2", "3", "5", "6"],
-            "description": "Last name only",
-            "threshold": 0.5
-        },
-        # Full name queries
-        {
-            "query": "John Smith",
-            "expected_ids": ["1", "2", "3"],
-            "description": "Full name without middle",
-            "threshold": 0.5
-        },
-        {
-            "query": "Michael Johnson",
-            "expected_ids": ["7", "8"],
-            "description": "Full name without middle",
-            "threshold": 0.5
-        },
-        # Middle name queries
-        {
-            "query": "John Michael Smith",
-            "expected_ids": ["2"],
-            "description": "Full name with middle",
-            "threshold": 0.5
-        },
-        {
-            "query": "John M. Smith",
-            "expected_ids": ["3"],
-            "description": "Full name with initial",
-            "threshold": 0.5
-        },
-        # Typo cases
-        {
-            "query": "Jhon Smith",
-            "expected_ids": ["1", "2", "3"],
-            "description": "Typo in first name",
-            "threshold": 0.5
-        },
-        # Case variations
-        {
-            "query": "john smith",
-            "expected_ids": ["1", "2", "3"],
-            "description": "Lowercase",
-            "threshold": 0.5
-        },
-        # Semantic queries
-        {
-            "query": "Software Engineer Google",
-            "expected_ids": ["1"],
-            "description": "Semantic search",
-            "threshold": 0.5
-        },
-        {
-            "query": "Olympic Athlete",
-            "expected_ids": ["7"],
-            "description": "Semantic search",
-            "threshold": 0.5
-        },
-        {
-            "query": "CEO startup",
-            "expected_ids": ["9"],
-            "description": "Semantic search",
-            "threshold": 0.5
-        },
-    ]
+    test_cases = TEST_CASES_EXTENDED
     
-    # Initialize all models
+    # Initialize all models: loading is disk I/O and torch/NumPy setup, which release the GIL,
+    # so the loads run in threads (each model's load_time then includes some contention)
     print("\nInitializing models...")
-    models = {}
-    
-    # POTION models
-    print("  Loading POTION baseline...")
-    models['potion_baseline'] = FlexibleEntityDisambiguator(
-        model_name="minishlab/potion-multilingual-128M",
-        model_type="static"
-    )
-    
-    print("  Loading POTION improved...")
-    models['potion_improved'] = ImprovedFlexibleEntityDisambiguator(
-        model_name="minishlab/potion-multilingual-128M",
-        model_type="static"
-    )
-    
-    # MiniLM models
-    print("  Loading MiniLM baseline...")
-    models['minilm_baseline'] = FlexibleEntityDisambiguator(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_type="sentence-transformer"
-    )
-    
-    print("  Loading MiniLM improved...")
-    models['minilm_improved'] = ImprovedFlexibleEntityDisambiguator(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_type="sentence-transformer"
-    )
-    
-    # Create embeddings for all models
+    model_specs = [
+        (f"{family}_{variant}", f"{MODEL_FAMILIES[family][0]} {variant}", f"{MODEL_FAMILIES[family][0]} {variant.title()}",
+         disambiguator_class, MODEL_FAMILIES[family][1], MODEL_FAMILIES[family][2])
+        for family in families
+        for variant, disambiguator_class in (("baseline", FlexibleEntityDisambiguator),
+                                             ("improved", ImprovedFlexibleEntityDisambiguator))
+    ]
+    model_keys = [key for key, _, _, _, _, _ in model_specs]
+    for _, label, _, _, _, _ in model_specs:
+        print(f"  Loading {label}...")
+    with ThreadPoolExecutor(max_workers=len(model_specs)) as executor:
+        models = dict(zip(model_keys, executor.map(
+            lambda spec: spec[3](model_name=spec[4], model_type=spec[5],
+                                 embedding_cache_dir=DEFAULT_EMBEDDING_CACHE_DIR), model_specs
+        )))
+    
+    # Create embeddings for all models, also concurrently. The entity set is fixed, so the encoded
+    # matrices are saved under DEFAULT_EMBEDDING_CACHE_DIR and later runs load them from disk
     print("\nCreating embeddings...")
-    embeddings = {}
-    
-    print("  Creating POTION baseline embeddings...")
-    embeddings['potion_baseline'] = models['potion_baseline'].create_entity_embeddings(entities)
-    
-    print("  Creating POTION improved embeddings...")
-    embeddings['potion_improved'] = models['potion_improved'].create_entity_embeddings(entities)
-    
-    print("  Creating MiniLM baseline embeddings...")
-    embeddings['minilm_baseline'] = models['minilm_baseline'].create_entity_embeddings(entities)
-    
-    print("  Creating MiniLM improved embeddings...")
-    embeddings['minilm_improved'] = models['minilm_improved'].create_entity_embeddings(entities)
+    for _, label, _, _, _, _ in model_specs:
+        print(f"  Creating {label} embeddings...")
+    with ThreadPoolExecutor(max_workers=len(model_specs)) as executor:
+        embeddings = dict(zip(model_keys, executor.map(
+            lambda key: models[key].create_entity_embeddings(entities), model_keys
+        )))
     
     # Evaluate all approaches
     print("\nRunning evaluations...")
-    results = {}
     
     configs = [
-        ('potion_baseline', "POTION Baseline", models['potion_baseline'], embeddings['potion_baseline']),
-        ('potion_improved', "POTION Improved", models['potion_improved'], embeddings['potion_improved']),
-        ('minilm_baseline', "MiniLM Baseline", models['minilm_baseline'], embeddings['minilm_baseline']),
-        ('minilm_improved', "MiniLM Improved", models['minilm_improved'], embeddings['minilm_improved']),
+        (key, name, models[key], embeddings[key]) for key, _, name, _, _, _ in model_specs
     ]
     
-    for key, name, model, emb in configs:
-        print(f"  Evaluating {name}...")
-        results[key] = evaluate_disambiguator(
-            model, entities, emb, test_cases, name
+    def evaluate_config(config):
+        key, name, model, emb = config
+        # All test queries go through the model in one batch instead of one forward pass per search
+        return key, evaluate_disambiguator(
+            model, entities, emb, test_cases, name,
+            search_cache_path=search_cache_path,
+            query_embeddings=precompute_query_embeddings(model, test_cases)
         )
     
+    for _, name, _, _ in configs:
+        print(f"  Evaluating {name}...")
+    # The evaluations are independent. Threads rather than processes: the loaded models do not
+    # pickle, and torch inference and the NumPy scoring release the GIL. With the search cache they
+    # run one at a time, since not every dbm backend behind shelve allows concurrent writers
+    with ThreadPoolExecutor(max_workers=1 if search_cache_path is not None else len(configs)) as executor:
+        results = dict(executor.map(evaluate_config, configs))
+    
     # Print comparison tables
     print("\n" + "="*100)
     print("MODEL COMPARISON: POTION vs MiniLM")
@@ -182,10 +93,10 @@ def run_model_comparison():
     # Overall metrics comparison
     print("\nOVERALL METRICS:")
     metrics_data = []
-    headers = ["Metric", "POTION Baseline", "POTION Improved", "MiniLM Baseline", "MiniLM Improved"]
+    headers = ["Metric", *(name for _, name, _, _ in configs)]
     
     # Add separator
-    metrics_data.append(["-"*15] + ["-"*18]*4)
+    metrics_data.append(["-"*15] + ["-"*18]*len(configs))
     
     # Metrics to compare
     metric_names = [
@@ -197,16 +108,16 @@ def run_model_comparison():
         ("Macro F1", 'macro', 'f1'),
     ]
     
-    for metric_label, category, metric in metric_names:
-        row = [metric_label]
-        for key in ['potion_baseline', 'potion_improved', 'minilm_baseline', 'minilm_improved']:
-            value = results[key][category][metric]
-            row.append(f"{value:.3f}")
-        metrics_data.append(row)
+    # (metric, model) values looked up once; both tables below format their cells from this matrix
+    metric_matrix = np.array([[results[key][category][metric] for key in model_keys]
+                              for _, category, metric in metric_names])
+    
+    for i, (metric_label, _, _) in enumerate(metric_names):
+        metrics_data.append([metric_label, *(f"{value:.3f}" for value in metric_matrix[i])])
     
     # Perfect F1 queries
     row = ["Perfect F1 Queries"]
-    for key in ['potion_baseline', 'potion_improved', 'minilm_baseline', 'minilm_improved']:
+    for key in model_keys:
         perfect = sum(1 for m in results[key]['per_query'] if m['f1'] == 1.0)
         row.append(f"{perfect}/{len(test_cases)}")
     metrics_data.append(row)
@@ -219,24 +130,15 @@ def run_model_comparison():
     print("="*100)
     
     improvement_data = []
-    improvement_headers = ["Metric", "POTION (Baseline→Improved)", "MiniLM (Baseline→Improved)"]
-    improvement_data.append(["-"*20, "-"*25, "-"*25])
+    improvement_headers = ["Metric", *(f"{MODEL_FAMILIES[family][0]} (Baseline→Improved)" for family in families)]
+    improvement_data.append(["-"*20] + ["-"*25]*len(families))
     
-    for metric_label, category, metric in metric_names:
+    # Baseline -> improved per model family: columns 2j/2j+1 are family j's baseline/improved
+    for i, (metric_label, _, _) in enumerate(metric_names):
         row = [metric_label]
-        
-        # POTION improvement
-        potion_base = results['potion_baseline'][category][metric]
-        potion_imp = results['potion_improved'][category][metric]
-        potion_change = ((potion_imp - potion_base) / potion_base * 100) if potion_base > 0 else 0
-        row.append(f"{potion_base:.3f} → {potion_imp:.3f} ({potion_change:+.1f}%)")
-        
-        # MiniLM improvement
-        minilm_base = results['minilm_baseline'][category][metric]
-        minilm_imp = results['minilm_improved'][category][metric]
-        minilm_change = ((minilm_imp - minilm_base) / minilm_base * 100) if minilm_base > 0 else 0
-        row.append(f"{minilm_base:.3f} → {minilm_imp:.3f} ({minilm_change:+.1f}%)")
-        
+        for base, imp in metric_matrix[i].reshape(-1, 2):
+            change = ((imp - base) / base * 100) if base > 0 else 0
+            row.append(f"{base:.3f} → {imp:.3f} ({change:+.1f}%)")
         improvement_data.append(row)
     
     print(tabulate(improvement_data, headers=improvement_headers, tablefmt="grid"))
@@ -255,13 +157,11 @@ def run_model_comparison():
         # Load time
         load_time = model.load_time
         
-        # Search time (average of 10 searches)
-        search_times = []
-        for _ in range(10):
-            start = time.time()
-            _, _, _ = model.search(test_query, entities, emb, threshold=0.5)
-            search_times.append((time.time() - start) * 1000)
-        avg_search_time = np.mean(search_times)
+        # Search time: one warm-up call (query cache, first-call compilation), then autorange
+        # picks the iteration count so fast and slow models both get a stable average
+        model.search(test_query, entities, emb, threshold=0.5)
+        iterations, seconds = timeit.Timer(lambda: model.search(test_query, entities, emb, threshold=0.5)).autorange()
+        avg_search_time = seconds / iterations * 1000
         
         speed_data.append([name, f"{load_time:.2f}", f"{avg_search_time:.2f}"])
     
@@ -272,6 +172,13 @@ def run_model_comparison():
     print("KEY FINDINGS")
     print("="*100)
     
+    if len(families) == 1:
+        name = MODEL_FAMILIES[families[0]][0]
+        print(f"\n1. {name} overall F1: {results[families[0] + '_baseline']['overall']['f1']:.3f} (baseline) → "
+              f"{results[families[0] + '_improved']['overall']['f1']:.3f} (improved)")
+        print("2. Run with --models both to compare POTION against MiniLM")
+        return
+    
     # Calculate which model performed best
     best_f1_baseline = max(results['potion_baseline']['overall']['f1'], 
                           results['minilm_baseline']['overall']['f1'])
@@ -286,4 +193,11 @@ def run_model_comparison():
 
 
 if __name__ == "__main__":
-    run_model_comparison()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=run_model_comparison.__doc__)
+    parser.add_argument('--models', choices=['potion', 'minilm', 'both'], default='both',
+                        help="model families to load and compare (default: both)")
+    parser.add_argument('--search-cache', action='store_true',
+                        help=f"reuse search results saved by earlier runs in {DEFAULT_EVAL_SEARCH_CACHE_PATH}")
+    args = parser.parse_args()
+    run_model_comparison(('potion', 'minilm') if args.models == 'both' else (args.models,),
+                         DEFAULT_EVAL_SEARCH_CACHE_PATH if args.search_cache else None)
\ No newline at end of file
@@ -1,6 +1,7 @@
 from entity_disambiguation import EntityDisambiguator
 from entity_disambiguation_improved import ImprovedEntityDisambiguator
 from evaluate_metrics import evaluate_disambiguator
+from fixtures import ENTITIES_EXTENDED
 from tabulate import tabulate
 import numpy as np
 
@@ -8,26 +9,13 @@ import numpy as np
 def main():
     print("Evaluating with comprehensive test cases including middle names...")
     
-    # Initialize both approaches
+    # Initialize both approaches on one loaded model; they share its query embedding cache,
+    # so each test query is encoded once for both evaluations
     original = EntityDisambiguator()
-    improved = ImprovedEntityDisambiguator()
+    improved = ImprovedEntityDisambiguator(model=original.model, query_cache=original.query_cache)
     
     # Extended entities with middle names
-    entities = [
-        {"id": "1", "descriptor": "John Smith - Software Engineer at Google"},
-        {"id": "2", "descriptor": "John Michael Smith - Professor of Physics at MIT"},
-        {"id": "3", "descriptor": "John M. Smith - Data Scientist at Facebook"},
-        {"id": "4", "descriptor": "John Doe - Data Scientist at Microsoft"},
-        {"id": "5", "descriptor": "Jane Smith - Product Manager at Apple"},
-        {"id": "6", "descriptor": "Jane Marie Smith - Designer at Adobe"},
-        {"id": "7", "descriptor": "Michael Johnson - Olympic Athlete"},
-        {"id": "8", "descriptor": "Michael J. Johnson - Basketball Player"},
-        {"id": "9", "descriptor": "Sarah Johnson - CEO of Tech Startup"},
-        {"id": "10", "descriptor": "John Williams - Composer"},
-        {"id": "11", "descriptor": "Robert Johnson - Blues Musician"},
-        {"id": "12", "descriptor": "Mary Jane Watson - Journalist"},
-        {"id": "13", "descriptor": "J. Paul Jones - Musician"},
-    ]
+    entities = ENTITIES_EXTENDED
     
     # Create embeddings
     original_embeddings = original.create_entity_embeddings(entities)
@@ -172,13 +160,13 @@ def main():
         },
     ]
     
-    # Evaluate both approaches
+    # Evaluate both approaches; all queries of a threshold are encoded and scored in one batch
     original_results = evaluate_disambiguator(
-        original, entities, original_embeddings, test_cases, "Original POTION"
+        original, entities, original_embeddings, test_cases, "Original POTION", use_search_batch=True
     )
     
     improved_results = evaluate_disambiguator(
-        improved, entities, improved_embeddings, test_cases, "Improved"
+        improved, entities, improved_embeddings, test_cases, "Improved", use_search_batch=True
     )
     
     # Print comprehensive results
@@ -32,17 +32,15 @@ def explain_metrics_difference():
         }
     ]
     
-    # Calculate per-query metrics
-    print("\nPER-QUERY METRICS:")
-    per_query_recalls = []
-    per_query_precisions = []
+    # Confusion counts as arrays; per-query metrics for all queries at once (0 where undefined)
+    tp = np.array([q["tp"] for q in queries])
+    fp = np.array([q["fp"] for q in queries])
+    fn = np.array([q["fn"] for q in queries])
+    per_query_recalls = np.divide(tp, tp + fn, out=np.zeros(len(queries)), where=(tp + fn) > 0)
+    per_query_precisions = np.divide(tp, tp + fp, out=np.zeros(len(queries)), where=(tp + fp) > 0)
     
-    for q in queries:
-        recall = q["tp"] / (q["tp"] + q["fn"]) if (q["tp"] + q["fn"]) > 0 else 0
-        precision = q["tp"] / (q["tp"] + q["fp"]) if (q["tp"] + q["fp"]) > 0 else 0
-        per_query_recalls.append(recall)
-        per_query_precisions.append(precision)
-        
+    print("\nPER-QUERY METRICS:")
+    for q, recall, precision in zip(queries, per_query_recalls, per_query_precisions):
         print(f"\n{q['name']}:")
         print(f"  Expected: {q['expected']} (count: {len(q['expected'])})")
         print(f"  Predicted: {q['predicted']} (count: {len(q['predicted'])})")
@@ -50,18 +48,18 @@ def explain_metrics_difference():
         print(f"  Recall: {recall:.2f}, Precision: {precision:.2f}")
     
     # Calculate MACRO metrics
-    macro_recall = np.mean(per_query_recalls)
-    macro_precision = np.mean(per_query_precisions)
+    macro_recall = per_query_recalls.mean()
+    macro_precision = per_query_precisions.mean()
     
     print(f"\n" + "="*80)
     print("MACRO METRICS (Average of per-query metrics):")
-    print(f"  Macro Recall = ({' + '.join([f'{r:.2f}' for r in per_query_recalls])}) / 3 = {macro_recall:.3f}")
-    print(f"  Macro Precision = ({' + '.join([f'{p:.2f}' for p in per_query_precisions])}) / 3 = {macro_precision:.3f}")
+    print(f"  Macro Recall = ({' + '.join([f'{r:.2f}' for r in per_query_recalls])}) / {len(queries)} = {macro_recall:.3f}")
+    print(f"  Macro Precision = ({' + '.join([f'{p:.2f}' for p in per_query_precisions])}) / {len(queries)} = {macro_precision:.3f}")
     
     # Calculate OVERALL metrics
-    total_tp = sum(q["tp"] for q in queries)
-    total_fp = sum(q["fp"] for q in queries)
-    total_fn = sum(q["fn"] for q in queries)
+    total_tp = int(tp.sum())
+    total_fp = int(fp.sum())
+    total_fn = int(fn.sum())
     
     overall_recall = total_tp / (total_tp + total_fn) if (total_tp + total_fn) > 0 else 0
     overall_precision = total_tp / (total_tp + total_fp) if (total_tp + total_fp) > 0 else 0
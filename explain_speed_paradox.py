@@ -1,5 +1,6 @@
 from entity_disambiguation_improved_flexible import ImprovedFlexibleEntityDisambiguator
 from entity_disambiguation_flexible import FlexibleEntityDisambiguator
+from similarity import scoring_backend
 import time
 import numpy as np
 
@@ -37,9 +38,9 @@ def explain_speed_paradox():
     print("   → Result: Improved is 30-40x FASTER")
     
     print("\n2. PARTIAL NAME QUERIES (e.g., 'John'):")
-    print("   - Improved: Must check EVERY entity's name parts")
-    print("     • Extract first/last/middle names")
-    print("     • Compare against each part")
+    print("   - Improved: Must find EVERY entity with a matching name part")
+    print("     • First/last/middle names are split and lowercased once, when the index is built")
+    print("     • One lookup of the query token in the name-token index")
     print("     • May still need embeddings for semantic fallback")
     print("   - Baseline: Just compute cosine similarity once")
     print("   → Result: Improved is 5x SLOWER due to overhead")
@@ -63,7 +64,9 @@ def explain_speed_paradox():
         print(f"\nQuery: '{query}' (Type: {query_type})")
         print("-"*50)
         
-        # Track operations
+        # Track operations (after one untimed call, so numba kernel loading and other
+        # first-call setup are not counted as search time)
+        improved.search(query, entities, improved_embeddings, 0.5)
         start = time.time()
         results, _, match_type = improved.search(query, entities, improved_embeddings, 0.5)
         total_time = (time.time() - start) * 1000
@@ -71,7 +74,7 @@ def explain_speed_paradox():
         if query_type == "exact":
             print("Improved approach steps:")
             print("1. Detect query type: full name")
-            print("2. Check exact match: 'john smith' == 'john smith - ...' → YES!")
+            print("2. Check exact match: look up 'john smith' in the precomputed lowercased name index → YES!")
             print("3. Return immediately")
             print(f"Total time: {total_time:.3f}ms")
             print("\nBaseline approach steps:")
@@ -83,11 +86,13 @@ def explain_speed_paradox():
         elif query_type == "partial":
             print("Improved approach steps:")
             print("1. Detect query type: partial name")
-            print("2. For EACH entity:")
-            print("   - Check if 'john' == first name")
-            print("   - Check if 'john' == last name")
-            print("   - Check if 'john' in middle names")
-            print("   - Possibly compute embedding similarity")
+            print("2. Look up 'john' in the name-token index built at embedding time")
+            print("   (lowercased first/middle/last names of every entity, parsed once):")
+            print("   - Entities where 'john' is the first name")
+            print("   - Entities where 'john' is the last name")
+            print("   - Entities where 'john' is a middle name")
+            print("   - Possibly compute embedding similarity: one dot-product pass over the")
+            print(f"     pre-normalized first/last name embeddings ({scoring_backend()})")
             print("3. Collect and sort all matches")
             print(f"Total time: {total_time:.3f}ms")
             print("\nBaseline approach steps:")
@@ -1,7 +1,10 @@
+import disambiguator_registry
+from caching import DEFAULT_EMBEDDING_CACHE_DIR
 from entity_disambiguation import EntityDisambiguator
 from entity_disambiguation_hybrid import HybridEntityDisambiguator
 from entity_disambiguation_improved import ImprovedEntityDisambiguator
 from evaluate_metrics import evaluate_disambiguator
+from fixtures import ENTITIES, TEST_CASES
 from tabulate import tabulate
 import numpy as np
 
@@ -9,23 +12,19 @@ import numpy as np
 def main():
     print("Generating comprehensive comparison table...")
     
-    # Initialize all approaches
-    original = EntityDisambiguator()
-    hybrid = HybridEntityDisambiguator()
-    improved = ImprovedEntityDisambiguator()
+    # Initialize all approaches on one loaded model and query cache. The entity set is fixed,
+    # so encoded matrices are saved under DEFAULT_EMBEDDING_CACHE_DIR and later runs load them from disk
+    model_name = disambiguator_registry.DEFAULT_MODEL_NAME
+    shared = dict(model=disambiguator_registry.get_model(model_name),
+                  query_cache=disambiguator_registry.get_query_cache(model_name),
+                  embedding_cache_dir=DEFAULT_EMBEDDING_CACHE_DIR)
+    # The original approach scores through a FAISS flat inner-product index when faiss is installed
+    original = EntityDisambiguator(model_name, use_faiss=True, **shared)
+    hybrid = HybridEntityDisambiguator(model_name, **shared)
+    improved = ImprovedEntityDisambiguator(model_name, **shared)
     
     # Define entities
-    entities = [
-        {"id": "1", "descriptor": "John Smith - Software Engineer at Google"},
-        {"id": "2", "descriptor": "John Smith - Professor of Physics at MIT"},
-        {"id": "3", "descriptor": "John Doe - Data Scientist at Microsoft"},
-        {"id": "4", "descriptor": "Jane Smith - Product Manager at Apple"},
-        {"id": "5", "descriptor": "Michael Johnson - Olympic Athlete"},
-        {"id": "6", "descriptor": "Michael Jordan - Basketball Player"},
-        {"id": "7", "descriptor": "Sarah Johnson - CEO of Tech Startup"},
-        {"id": "8", "descriptor": "John Williams - Composer"},
-        {"id": "9", "descriptor": "Robert Johnson - Blues Musician"},
-    ]
+    entities = ENTITIES
     
     # Create embeddings
     original_embeddings = original.create_entity_embeddings(entities)
@@ -33,103 +32,23 @@ def main():
     improved_embeddings = improved.create_entity_embeddings(entities)
     
     # Define comprehensive test cases
-    test_cases = [
-        # Partial name queries
-        {
-            "query": "John",
-            "expected_ids": ["1", "2", "3", "8"],
-            "description": "First name only",
-            "threshold": 0.5
-        },
-        {
-            "query": "Johnson",
-            "expected_ids": ["5", "7", "9"],
-            "description": "Last name only",
-            "threshold": 0.5
-        },
-        {
-            "query": "Smith",
-            "expected_ids": ["1", "2", "4"],
-            "description": "Last name only",
-            "threshold": 0.5
-        },
-        # Exact matches
-        {
-            "query": "John Smith",
-            "expected_ids": ["1", "2"],
-            "description": "Full name",
-            "threshold": 0.5
-        },
-        {
-            "query": "Michael Johnson",
-            "expected_ids": ["5"],
-            "description": "Exact full name",
-            "threshold": 0.5
-        },
-        {
-            "query": "Jane Smith",
-            "expected_ids": ["4"],
-            "description": "Exact full name",
-            "threshold": 0.5
-        },
-        # Typo cases
-        {
-            "query": "Jhon Smith",
-            "expected_ids": ["1", "2"],
-            "description": "Typo in first name",
-            "threshold": 0.5
-        },
-        {
-            "query": "Micheal Johnson",
-            "expected_ids": ["5"],
-            "description": "Common misspelling",
-            "threshold": 0.5
-        },
-        # Case variations
-        {
-            "query": "john smith",
-            "expected_ids": ["1", "2"],
-            "description": "Lowercase",
-            "threshold": 0.5
-        },
-        {
-            "query": "JOHN SMITH",
-            "expected_ids": ["1", "2"],
-            "description": "Uppercase",
-            "threshold": 0.5
-        },
-        # Semantic queries
-        {
-            "query": "Software Engineer Google",
-            "expected_ids": ["1"],
-            "description": "Semantic search",
-            "threshold": 0.5
-        },
-        {
-            "query": "Olympic Athlete",
-            "expected_ids": ["5"],
-            "description": "Semantic search",
-            "threshold": 0.5
-        },
-        {
-            "query": "CEO startup",
-            "expected_ids": ["7"],
-            "description": "Semantic search",
-            "threshold": 0.5
-        },
-    ]
+    test_cases = TEST_CASES
     
-    # Evaluate all approaches
+    # Evaluate all approaches; each encodes its test queries in batched encoder calls (search_batch)
+    # through the shared query cache. The original approach also scores all of them against the
+    # entity matrix in one (queries x entities) matmul; hybrid and improved need per-query exact
+    # and fuzzy checks first, and score the queries that reach the semantic step with one GEMM each
+    # Run one after another: the approaches share one query cache, which is not thread-safe
     original_results = evaluate_disambiguator(
-        original, entities, original_embeddings, test_cases, "Original POTION"
+        original, entities, original_embeddings, test_cases, "Original POTION", use_search_batch=True
     )
     
     hybrid_results = evaluate_disambiguator(
-        hybrid, entities, hybrid_embeddings, test_cases, "Hybrid"
+        hybrid, entities, hybrid_embeddings, test_cases, "Hybrid", use_search_batch=True
     )
     
     improved_results = evaluate_disambiguator(
-        improved, entities, improved_embeddings, test_cases, "Improved"
+        improved, entities, improved_embeddings, test_cases, "Improved", use_search_batch=True
     )
     
     # Print comprehensive comparison table
@@ -138,117 +57,33 @@ def main():
     print("="*120)
     
     # Overall and Macro metrics table
+    approach_names = ["Original", "Hybrid", "Improved"]
+    all_results = [original_results, hybrid_results, improved_results]
+    # Per-query F1 of every approach, shape (queries, approaches)
+    f1_matrix = np.array([[m['f1'] for m in results['per_query']] for results in all_results]).T
+    perfects = (f1_matrix == 1.0).sum(axis=0)
+    perfect_orig, perfect_improved = int(perfects[0]), int(perfects[2])
+    
     metrics_data = []
     
     # Header row
     metrics_data.append(["Metric", "Original POTION", "Hybrid Approach", "Improved Approach", "Best"])
     metrics_data.append(["-"*20, "-"*20, "-"*20, "-"*20, "-"*10])
     
-    # Overall metrics
-    metrics_data.append(["**OVERALL METRICS**", "", "", "", ""])
-    
-    # Precision
-    precisions = [
-        original_results['overall']['precision'],
-        hybrid_results['overall']['precision'],
-        improved_results['overall']['precision']
-    ]
-    best_precision_idx = np.argmax(precisions)
-    precision_row = ["Precision", 
-                     f"{precisions[0]:.3f}",
-                     f"{precisions[1]:.3f}",
-                     f"{precisions[2]:.3f}",
-                     ["Original", "Hybrid", "Improved"][best_precision_idx]]
-    metrics_data.append(precision_row)
-    
-    # Recall
-    recalls = [
-        original_results['overall']['recall'],
-        hybrid_results['overall']['recall'],
-        improved_results['overall']['recall']
-    ]
-    best_recall_idx = np.argmax(recalls)
-    recall_row = ["Recall", 
-                  f"{recalls[0]:.3f}",
-                  f"{recalls[1]:.3f}",
-                  f"{recalls[2]:.3f}",
-                  ["Original", "Hybrid", "Improved"][best_recall_idx]]
-    metrics_data.append(recall_row)
-    
-    # F1
-    f1s = [
-        original_results['overall']['f1'],
-        hybrid_results['overall']['f1'],
-        improved_results['overall']['f1']
-    ]
-    best_f1_idx = np.argmax(f1s)
-    f1_row = ["F1 Score", 
-              f"{f1s[0]:.3f}",
-              f"{f1s[1]:.3f}",
-              f"{f1s[2]:.3f}",
-              ["Original", "Hybrid", "Improved"][best_f1_idx]]
-    metrics_data.append(f1_row)
-    
-    # Macro metrics
-    metrics_data.append(["", "", "", "", ""])
-    metrics_data.append(["**MACRO METRICS**", "", "", "", ""])
-    
-    # Macro Precision
-    macro_precisions = [
-        original_results['macro']['precision'],
-        hybrid_results['macro']['precision'],
-        improved_results['macro']['precision']
-    ]
-    best_macro_precision_idx = np.argmax(macro_precisions)
-    macro_precision_row = ["Macro Precision", 
-                           f"{macro_precisions[0]:.3f}",
-                           f"{macro_precisions[1]:.3f}",
-                           f"{macro_precisions[2]:.3f}",
-                           ["Original", "Hybrid", "Improved"][best_macro_precision_idx]]
-    metrics_data.append(macro_precision_row)
-    
-    # Macro Recall
-    macro_recalls = [
-        original_results['macro']['recall'],
-        hybrid_results['macro']['recall'],
-        improved_results['macro']['recall']
-    ]
-    best_macro_recall_idx = np.argmax(macro_recalls)
-    macro_recall_row = ["Macro Recall", 
-                        f"{macro_recalls[0]:.3f}",
-                        f"{macro_recalls[1]:.3f}",
-                        f"{macro_recalls[2]:.3f}",
-                        ["Original", "Hybrid", "Improved"][best_macro_recall_idx]]
-    metrics_data.append(macro_recall_row)
-    
-    # Macro F1
-    macro_f1s = [
-        original_results['macro']['f1'],
-        hybrid_results['macro']['f1'],
-        improved_results['macro']['f1']
-    ]
-    best_macro_f1_idx = np.argmax(macro_f1s)
-    macro_f1_row = ["Macro F1 Score", 
-                    f"{macro_f1s[0]:.3f}",
-                    f"{macro_f1s[1]:.3f}",
-                    f"{macro_f1s[2]:.3f}",
-                    ["Original", "Hybrid", "Improved"][best_macro_f1_idx]]
-    metrics_data.append(macro_f1_row)
+    # Overall and macro precision/recall/F1, best approach per row
+    for section_title, section, labels in (
+        ("**OVERALL METRICS**", 'overall', ("Precision", "Recall", "F1 Score")),
+        ("**MACRO METRICS**", 'macro', ("Macro Precision", "Macro Recall", "Macro F1 Score")),
+    ):
+        metrics_data.append([section_title, "", "", "", ""])
+        for label, metric in zip(labels, ('precision', 'recall', 'f1')):
+            values = [results[section][metric] for results in all_results]
+            metrics_data.append([label, *(f"{value:.3f}" for value in values), approach_names[np.argmax(values)]])
+        metrics_data.append(["", "", "", "", ""])
     
     # Perfect scores
-    metrics_data.append(["", "", "", "", ""])
-    perfect_orig = sum(1 for m in original_results['per_query'] if m['f1'] == 1.0)
-    perfect_hybrid = sum(1 for m in hybrid_results['per_query'] if m['f1'] == 1.0)
-    perfect_improved = sum(1 for m in improved_results['per_query'] if m['f1'] == 1.0)
-    
-    perfects = [perfect_orig, perfect_hybrid, perfect_improved]
-    best_perfect_idx = np.argmax(perfects)
-    perfect_row = ["Perfect F1 Queries", 
-                   f"{perfect_orig}/{len(test_cases)}",
-                   f"{perfect_hybrid}/{len(test_cases)}",
-                   f"{perfect_improved}/{len(test_cases)}",
-                   ["Original", "Hybrid", "Improved"][best_perfect_idx]]
-    metrics_data.append(perfect_row)
+    metrics_data.append(["Perfect F1 Queries", *(f"{count}/{len(test_cases)}" for count in perfects),
+                         approach_names[np.argmax(perfects)]])
     
     # Print the table
     print(tabulate(metrics_data, headers="firstrow", tablefmt="grid", colalign=("left", "center", "center", "center", "center")))
@@ -262,24 +97,17 @@ def main():
     query_data.append(["Query", "Type", "Original", "Hybrid", "Improved", "Winner"])
     query_data.append(["-"*25, "-"*15, "-"*10, "-"*10, "-"*10, "-"*10])
     
-    for i, test in enumerate(test_cases):
-        orig_f1 = original_results['per_query'][i]['f1']
-        hybrid_f1 = hybrid_results['per_query'][i]['f1']
-        improved_f1 = improved_results['per_query'][i]['f1']
-        
-        f1_scores = [orig_f1, hybrid_f1, improved_f1]
-        best_idx = np.argmax(f1_scores)
-        winner = ["Original", "Hybrid", "Improved"][best_idx]
-        if f1_scores.count(max(f1_scores)) > 1:
-            winner = "Tie"
-        
+    # Winner per query: the best approach, or "Tie" when several share the best F1
+    winners = f1_matrix.argmax(axis=1)
+    ties = (f1_matrix == f1_matrix.max(axis=1, keepdims=True)).sum(axis=1) > 1
+    winner_names = np.where(ties, "Tie", np.array(approach_names)[winners])
+    
+    for test, f1_scores, winner in zip(test_cases, f1_matrix, winner_names):
         query_data.append([
             test['query'][:25],
             test['description'],
-            f"{orig_f1:.3f}",
-            f"{hybrid_f1:.3f}",
-            f"{improved_f1:.3f}",
-            winner
+            *(f"{f1:.3f}" for f1 in f1_scores),
+            str(winner)
         ])
     
     print(tabulate(query_data, headers="firstrow", tablefmt="grid"))
@@ -0,0 +1,372 @@
+"""
+Shared entity and test-case fixtures for the analysis scripts.
+
+The entity sets (ENTITIES, ENTITIES_EXTENDED) and test-case sets (TEST_CASES,
+TEST_CASES_METRICS, TEST_CASES_IMPROVED, TEST_CASES_EXTENDED) are module-level
+tuples, built once per process and usable as (part of) cache keys;
+cached_embeddings() builds each disambiguator's embeddings for a given id set
+once per process and hands out the same object afterwards (treat as read-only).
+"""
+
+from functools import lru_cache
+from typing import Tuple
+import disambiguator_registry
+
+
+# Nine-person entity set (two John Smiths, three Johnsons, ...)
+ENTITIES = (
+    {"id": "1", "descriptor": "John Smith - Software Engineer at Google"},
+    {"id": "2", "descriptor": "John Smith - Professor of Physics at MIT"},
+    {"id": "3", "descriptor": "John Doe - Data Scientist at Microsoft"},
+    {"id": "4", "descriptor": "Jane Smith - Product Manager at Apple"},
+    {"id": "5", "descriptor": "Michael Johnson - Olympic Athlete"},
+    {"id": "6", "descriptor": "Michael Jordan - Basketball Player"},
+    {"id": "7", "descriptor": "Sarah Johnson - CEO of Tech Startup"},
+    {"id": "8", "descriptor": "John Williams - Composer"},
+    {"id": "9", "descriptor": "Robert Johnson - Blues Musician"},
+)
+
+# Queries with their expected entity ids over ENTITIES
+TEST_CASES = (
+    {
+        "query": "John",
+        "expected_ids": ["1", "2", "3", "8"],  # 4 expected
+        "description": "First name only",
+        "threshold": 0.5
+    },
+    {
+        "query": "Johnson",
+        "expected_ids": ["5", "7", "9"],  # 3 expected
+        "description": "Last name only",
+        "threshold": 0.5
+    },
+    {
+        "query": "Smith",
+        "expected_ids": ["1", "2", "4"],  # 3 expected
+        "description": "Last name only",
+        "threshold": 0.5
+    },
+    {
+        "query": "John Smith",
+        "expected_ids": ["1", "2"],  # 2 expected
+        "description": "Full name",
+        "threshold": 0.5
+    },
+    {
+        "query": "Michael Johnson",
+        "expected_ids": ["5"],  # 1 expected
+        "description": "Exact full name",
+        "threshold": 0.5
+    },
+    {
+        "query": "Jane Smith",
+        "expected_ids": ["4"],  # 1 expected
+        "description": "Exact full name",
+        "threshold": 0.5
+    },
+    {
+        "query": "Jhon Smith",
+        "expected_ids": ["1", "2"],  # 2 expected
+        "description": "Typo in first name",
+        "threshold": 0.5
+    },
+    {
+        "query": "Micheal Johnson",
+        "expected_ids": ["5"],  # 1 expected
+        "description": "Common misspelling",
+        "threshold": 0.5
+    },
+    {
+        "query": "john smith",
+        "expected_ids": ["1", "2"],  # 2 expected
+        "description": "Lowercase",
+        "threshold": 0.5
+    },
+    {
+        "query": "JOHN SMITH",
+        "expected_ids": ["1", "2"],  # 2 expected
+        "description": "Uppercase",
+        "threshold": 0.5
+    },
+    {
+        "query": "Software Engineer Google",
+        "expected_ids": ["1"],  # 1 expected
+        "description": "Semantic search",
+        "threshold": 0.5
+    },
+    {
+        "query": "Olympic Athlete",
+        "expected_ids": ["5"],  # 1 expected
+        "description": "Semantic search",
+        "threshold": 0.5
+    },
+    {
+        "query": "CEO startup",
+        "expected_ids": ["7"],  # 1 expected
+        "description": "Semantic search",
+        "threshold": 0.5
+    },
+)
+
+# Thirteen-person entity set with middle names and initials (John Michael Smith, J. Paul Jones, ...)
+ENTITIES_EXTENDED = (
+    {"id": "1", "descriptor": "John Smith - Software Engineer at Google"},
+    {"id": "2", "descriptor": "John Michael Smith - Professor of Physics at MIT"},
+    {"id": "3", "descriptor": "John M. Smith - Data Scientist at Facebook"},
+    {"id": "4", "descriptor": "John Doe - Data Scientist at Microsoft"},
+    {"id": "5", "descriptor": "Jane Smith - Product Manager at Apple"},
+    {"id": "6", "descriptor": "Jane Marie Smith - Designer at Adobe"},
+    {"id": "7", "descriptor": "Michael Johnson - Olympic Athlete"},
+    {"id": "8", "descriptor": "Michael J. Johnson - Basketball Player"},
+    {"id": "9", "descriptor": "Sarah Johnson - CEO of Tech Startup"},
+    {"id": "10", "descriptor": "John Williams - Composer"},
+    {"id": "11", "descriptor": "Robert Johnson - Blues Musician"},
+    {"id": "12", "descriptor": "Mary Jane Watson - Journalist"},
+    {"id": "13", "descriptor": "J. Paul Jones - Musician"},
+)
+
+# Exact, typo, case, partial and semantic queries over ENTITIES (evaluate_metrics.py)
+TEST_CASES_METRICS = (
+    # Exact match cases
+    {
+        "query": "John Smith",
+        "expected_ids": ["1", "2"],  # Both John Smiths
+        "description": "Exact name - should return both John Smiths",
+        "threshold": 0.5
+    },
+    {
+        "query": "Michael Johnson",
+        "expected_ids": ["5"],  # Only the Olympic athlete
+        "description": "Exact full name match",
+        "threshold": 0.5
+    },
+    {
+        "query": "Jane Smith",
+        "expected_ids": ["4"],
+        "description": "Exact match - Jane Smith",
+        "threshold": 0.5
+    },
+
+    # Typo cases
+    {
+        "query": "Jhon Smith",
+        "expected_ids": ["1", "2"],  # Should still match both John Smiths
+        "description": "Typo - should handle and return John Smiths",
+        "threshold": 0.5
+    },
+    {
+        "query": "Micheal Johnson",
+        "expected_ids": ["5"],  # Should match Michael Johnson
+        "description": "Common misspelling",
+        "threshold": 0.5
+    },
+
+    # Case variations
+    {
+        "query": "john smith",
+        "expected_ids": ["1", "2"],
+        "description": "Lowercase - should be case insensitive",
+        "threshold": 0.5
+    },
+    {
+        "query": "MICHAEL JOHNSON",
+        "expected_ids": ["5"],
+        "description": "Uppercase - should be case insensitive",
+        "threshold": 0.5
+    },
+
+    # Partial matches
+    {
+        "query": "John",
+        "expected_ids": ["1", "2", "3", "8"],  # All Johns
+        "description": "First name only - should match all Johns",
+        "threshold": 0.4
+    },
+    {
+        "query": "Johnson",
+        "expected_ids": ["5", "7", "9"],  # All Johnsons
+        "description": "Last name only - should match all Johnsons",
+        "threshold": 0.4
+    },
+    {
+        "query": "Smith",
+        "expected_ids": ["1", "2", "4"],  # All Smiths
+        "description": "Last name only - should match all Smiths",
+        "threshold": 0.4
+    },
+
+    # Semantic matches
+    {
+        "query": "Software Engineer Google",
+        "expected_ids": ["1"],  # John Smith at Google
+        "description": "Semantic search for role and company",
+        "threshold": 0.5
+    },
+    {
+        "query": "Olympic Athlete",
+        "expected_ids": ["5"],  # Michael Johnson
+        "description": "Semantic search for role",
+        "threshold": 0.5
+    },
+    {
+        "query": "CEO startup",
+        "expected_ids": ["7"],  # Sarah Johnson
+        "description": "Semantic search for role",
+        "threshold": 0.5
+    },
+)
+
+# Partial-name focused queries over ENTITIES (evaluate_improved.py)
+TEST_CASES_IMPROVED = (
+    # Partial name queries - the main problem area
+    {
+        "query": "John",
+        "expected_ids": ["1", "2", "3", "8"],  # All Johns
+        "description": "First name only - should match all Johns",
+        "threshold": 0.5
+    },
+    {
+        "query": "Johnson",
+        "expected_ids": ["5", "7", "9"],  # All Johnsons
+        "description": "Last name only - should match all Johnsons",
+        "threshold": 0.5
+    },
+    {
+        "query": "Smith",
+        "expected_ids": ["1", "2", "4"],  # All Smiths
+        "description": "Last name only - should match all Smiths",
+        "threshold": 0.5
+    },
+    # Full name queries
+    {
+        "query": "John Smith",
+        "expected_ids": ["1", "2"],
+        "description": "Full name - should match both John Smiths",
+        "threshold": 0.5
+    },
+    {
+        "query": "Michael Johnson",
+        "expected_ids": ["5"],
+        "description": "Exact full name",
+        "threshold": 0.5
+    },
+    # Typo cases
+    {
+        "query": "Jhon Smith",
+        "expected_ids": ["1", "2"],
+        "description": "Typo - should match John Smiths",
+        "threshold": 0.5
+    },
+    # Semantic queries
+    {
+        "query": "Software Engineer Google",
+        "expected_ids": ["1"],
+        "description": "Semantic search",
+        "threshold": 0.5
+    },
+)
+
+# Partial, middle-name, typo, case and semantic queries over ENTITIES_EXTENDED
+TEST_CASES_EXTENDED = (
+    # Partial name queries
+    {
+        "query": "John",
+        "expected_ids": ["1", "2", "3", "4", "10", "13"],
+        "description": "First name only",
+        "threshold": 0.5
+    },
+    {
+        "query": "Johnson",
+        "expected_ids": ["7", "8", "9", "11"],
+        "description": "Last name only",
+        "threshold": 0.5
+    },
+    {
+        "query": "Smith",
+        "expected_ids": ["1", "2", "3", "5", "6"],
+        "description": "Last name only",
+        "threshold": 0.5
+    },
+    # Full name queries
+    {
+        "query": "John Smith",
+        "expected_ids": ["1", "2", "3"],
+        "description": "Full name without middle",
+        "threshold": 0.5
+    },
+    {
+        "query": "Michael Johnson",
+        "expected_ids": ["7", "8"],
+        "description": "Full name without middle",
+        "threshold": 0.5
+    },
+    # Middle name queries
+    {
+        "query": "John Michael Smith",
+        "expected_ids": ["2"],
+        "description": "Full name with middle",
+        "threshold": 0.5
+    },
+    {
+        "query": "John M. Smith",
+        "expected_ids": ["3"],
+        "description": "Full name with initial",
+        "threshold": 0.5
+    },
+    # Typo cases
+    {
+        "query": "Jhon Smith",
+        "expected_ids": ["1", "2", "3"],
+        "description": "Typo in first name",
+        "threshold": 0.5
+    },
+    # Case variations
+    {
+        "query": "john smith",
+        "expected_ids": ["1", "2", "3"],
+        "description": "Lowercase",
+        "threshold": 0.5
+    },
+    # Semantic queries
+    {
+        "query": "Software Engineer Google",
+        "expected_ids": ["1"],
+        "description": "Semantic search",
+        "threshold": 0.5
+    },
+    {
+        "query": "Olympic Athlete",
+        "expected_ids": ["7"],
+        "description": "Semantic search",
+        "threshold": 0.5
+    },
+    {
+        "query": "CEO startup",
+        "expected_ids": ["9"],
+        "description": "Semantic search",
+        "threshold": 0.5
+    },
+)
+
+_ENTITIES_BY_ID = {entity["id"]: entity for entity in ENTITIES}
+
+
+def entities_by_ids(entity_ids: Tuple[str, ...]) -> Tuple[dict, ...]:
+    """Look up fixture entities by id, preserving the given order"""
+    return tuple(_ENTITIES_BY_ID[entity_id] for entity_id in entity_ids)
+
+
+@lru_cache(maxsize=None)
+def _raw_descriptor_embeddings(model_name: str, entity_ids: Tuple[str, ...]):
+    """Raw descriptor encodings, computed once per (model, id set) and shared across classes"""
+    encoder = disambiguator_registry.get("EntityDisambiguator", model_name)
+    return encoder._raw_encode([entity["descriptor"] for entity in entities_by_ids(entity_ids)])
+
+
+@lru_cache(maxsize=None)
+def cached_embeddings(disambiguator_cls_name: str, entity_ids: Tuple[str, ...],
+                      model_name: str = disambiguator_registry.DEFAULT_MODEL_NAME):
+    """Entity embeddings from the shared registry instance, computed once per (class, id set)"""
+    disambiguator = disambiguator_registry.get(disambiguator_cls_name, model_name)
+    raw = _raw_descriptor_embeddings(model_name, entity_ids)
+    return disambiguator.build_index(raw, list(entities_by_ids(entity_ids)))
@@ -2,9 +2,8 @@ from abc import ABC, abstractmethod
 from typing import List, Dict, Tuple, Optional
 import time
 import re
-from difflib import SequenceMatcher
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from similarity import cosine_scores, fuzzy_scores
 
 
 class EntityHandler(ABC):
@@ -39,10 +38,12 @@ class EntityHandler(ABC):
 class PersonNameHandler(EntityHandler):
     """Handler for person names (existing implementation)"""
     
+    # Descriptor separators, compiled once
+    split_pattern = re.compile(r' - | at | of ')
+    
     def extract_parts(self, entity_descriptor: str) -> Dict:
         # Extract name from descriptor
-        parts = re.split(r' - | at | of ', entity_descriptor)
-        full_name = parts[0].strip()
+        full_name = self.split_pattern.split(entity_descriptor, maxsplit=1)[0].strip()
         name_parts = full_name.split()
         
         middle_parts = name_parts[1:-1] if len(name_parts) > 2 else []
@@ -89,6 +90,9 @@ class PersonNameHandler(EntityHandler):
 class LocationHandler(EntityHandler):
     """Handler for location entities"""
     
+    # Descriptor separators, compiled once
+    split_pattern = re.compile(r' - | at ')
+    
     def __init__(self):
         self.abbreviations = {
             "nyc": "new york city",
@@ -101,12 +105,13 @@ class LocationHandler(EntityHandler):
         }
         
         self.suffixes = ["city", "town", "village", "county", "state", "province"]
+        # All suffixes in one alternation so normalization is a single regex pass
+        self.suffix_pattern = re.compile(r"\b(?:" + "|".join(self.suffixes) + r")\b")
         
     def extract_parts(self, entity_descriptor: str) -> Dict:
         # Parse location components
         # Handle formats: "City, State", "City - Description"
-        parts = re.split(r' - | at ', entity_descriptor)
-        location = parts[0].strip()
+        location = self.split_pattern.split(entity_descriptor, maxsplit=1)[0].strip()
         
         # Split by comma for city, state format
         components = [c.strip() for c in location.split(',')]
@@ -128,8 +133,7 @@ class LocationHandler(EntityHandler):
             normalized = normalized.replace(abbr, full)
         
         # Remove common suffixes
-        for suffix in self.suffixes:
-            normalized = re.sub(f"\\b{suffix}\\b", "", normalized)
+        normalized = self.suffix_pattern.sub("", normalized)
         
         # Standardize spacing
         normalized = ' '.join(normalized.split())
@@ -180,6 +184,16 @@ class LocationHandler(EntityHandler):
 class WorkRoleHandler(EntityHandler):
     """Handler for work roles and job titles"""
     
+    # Descriptor separators, compiled once
+    split_pattern = re.compile(r' - | at ')
+    # Query abbreviations, expanded in a single regex pass
+    replacements = {
+        "swe": "software engineer",
+        "pm": "product manager",
+        "eng": "engineer",
+    }
+    replacement_pattern = re.compile(r"\b(?:" + "|".join(replacements) + r")\b")
+    
     def __init__(self):
         self.synonyms = {
             "developer": ["developer", "engineer", "programmer"],
@@ -193,8 +207,7 @@ class WorkRoleHandler(EntityHandler):
         
     def extract_parts(self, entity_descriptor: str) -> Dict:
         # Extract role from descriptor
-        parts = re.split(r' - | at ', entity_descriptor)
-        role = parts[0].strip()
+        role = self.split_pattern.split(entity_descriptor, maxsplit=1)[0].strip()
         
         # Identify components
         role_lower = role.lower()
@@ -299,15 +312,7 @@ class WorkRoleHandler(EntityHandler):
     
     def normalize_query(self, query: str) -> str:
         # Expand common abbreviations
-        normalized = query.lower()
-        replacements = {
-            "swe": "software engineer",
-            "pm": "product manager",
-            "eng": "engineer",
-        }
-        
-        for abbr, full in replacements.items():
-            normalized = re.sub(f"\\b{abbr}\\b", full, normalized)
+        normalized = self.replacement_pattern.sub(lambda m: self.replacements[m.group(0)], query.lower())
         
         return ' '.join(normalized.split())
 
@@ -358,6 +363,7 @@ class GeneralizedEntityDisambiguator:
         embeddings = {
             "original": self.encode(descriptors),
             "normalized": self.encode(normalized),
+            "normalized_text": normalized,
             "parts": entity_parts
         }
         
@@ -395,11 +401,11 @@ class GeneralizedEntityDisambiguator:
         
         # Fuzzy matching
         fuzzy_matches = []
-        for idx, entity in enumerate(entities):
-            normalized_entity = self.handler.normalize_query(entity["descriptor"])
-            normalized_query = self.handler.normalize_query(query)
-            
-            fuzzy_score = SequenceMatcher(None, normalized_query, normalized_entity).ratio()
+        # One RapidFuzz call over the descriptors normalized at build time (difflib without rapidfuzz)
+        normalized_query = self.handler.normalize_query(query)
+        all_fuzzy = fuzzy_scores(normalized_query, entity_embeddings["normalized_text"], score_cutoff=0.85)
+        for entity, fuzzy_score in zip(entities, all_fuzzy):
+            fuzzy_score = float(fuzzy_score)
             
             if fuzzy_score >= 0.85:
                 fuzzy_matches.append({
@@ -410,15 +416,15 @@ class GeneralizedEntityDisambiguator:
         
         # Semantic search
         query_emb = self.encode([query]).reshape(1, -1)
-        similarities = cosine_similarity(query_emb, entity_embeddings["original"])[0]
+        similarities = cosine_scores(query_emb, entity_embeddings["original"])
         
         # Combine results
         all_matches = []
+        # Set of fuzzy-matched ids, so the check below is O(1) instead of a scan of fuzzy_matches
+        fuzzy_ids = {m["id"] for m in fuzzy_matches}
         for idx, entity in enumerate(entities):
             # Check if already in fuzzy matches
-            is_fuzzy = any(m["id"] == entity["id"] for m in fuzzy_matches)
-            
-            if is_fuzzy:
+            if entity["id"] in fuzzy_ids:
                 continue
             
             # Apply custom scoring
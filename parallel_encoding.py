@@ -0,0 +1,60 @@
+"""
+Data-parallel encoding for large entity sets: texts are sharded across worker
+processes, each holding its own single-threaded copy of the model.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import numpy as np
+from model2vec import StaticModel
+
+# Below this many texts, worker start-up (each worker loads the model) costs more than it saves
+PARALLEL_ENCODE_MIN_TEXTS = 20000
+# One thread per worker so cores are not oversubscribed. BLAS/OpenMP read these once, when
+# NumPy is first imported, so they must be in the environment before a worker starts
+WORKER_ENV = {
+    "OMP_NUM_THREADS": "1",
+    "OPENBLAS_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+    "TOKENIZERS_PARALLELISM": "false",
+}
+
+_worker_model = None
+
+
+def _init_worker(model_name: str):
+    """Load the model once per worker"""
+    global _worker_model
+    _worker_model = StaticModel.from_pretrained(model_name)
+
+
+def _encode_chunk(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_model.encode(texts), dtype=np.float32)
+
+
+def encode_parallel(model_name: str, texts: List[str], num_workers: Optional[int] = None) -> np.ndarray:
+    """
+    Encode texts as a C-contiguous float32 matrix across worker processes, rows in input order.
+    Workers are spawned (the calling script needs an `if __name__ == "__main__":` guard).
+    """
+    num_workers = max(1, min(num_workers or os.cpu_count() or 1, len(texts)))
+    chunk_size = -(-len(texts) // num_workers)
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+
+    # Spawned rather than forked: a forked worker inherits the parent's already initialized
+    # BLAS thread pool, so thread limits set inside it have no effect. Spawned workers copy
+    # the environment when they start, after which the parent's values are restored
+    saved_env = {name: os.environ.get(name) for name in WORKER_ENV}
+    os.environ.update(WORKER_ENV)
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(model_name,)) as executor:
+            return np.ascontiguousarray(np.vstack(list(executor.map(_encode_chunk, chunks))))
+    finally:
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
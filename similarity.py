@@ -0,0 +1,394 @@
+"""
+Similarity kernels shared by the disambiguators.
+Cosine uses SimSIMD when installed and falls back to a normalized NumPy dot product
+(FAISS inner-product and hnswlib HNSW indexes are available as opt-in alternatives);
+fuzzy string matching uses RapidFuzz when installed and falls back to difflib.
+"""
+
+from difflib import SequenceMatcher
+import importlib.util
+import os
+from typing import Dict, List, Optional, Tuple
+import threading
+import numpy as np
+
+try:
+    import simsimd
+    SIMSIMD_AVAILABLE = True
+except ImportError:
+    SIMSIMD_AVAILABLE = False
+
+try:
+    from rapidfuzz import fuzz, process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+# numba costs ~200 ms to import (it pulls in scipy), so only check it is installed
+# here and import it when the first kernel is compiled
+try:
+    NUMBA_AVAILABLE = importlib.util.find_spec("numba") is not None
+except (ImportError, ValueError):
+    NUMBA_AVAILABLE = False
+_combine_scores_jit = None
+_stack_max_jit = None
+# Held around parallel kernel launches until a threading layer that allows concurrent launches is active
+_kernel_launch_lock = threading.Lock()
+_concurrent_launches_safe = False
+
+
+def _import_numba():
+    """Import numba for the parallel kernels (None if the import fails)"""
+    global NUMBA_AVAILABLE
+    try:
+        import numba
+    except ImportError:
+        NUMBA_AVAILABLE = False
+        return None
+    # Kernels may be launched from worker threads (e.g. threaded evaluations). The TBB
+    # layer hangs at interpreter exit after a launch from a non-main thread, so prefer
+    # OpenMP unless a layer was chosen explicitly through NUMBA_THREADING_LAYER (the workqueue
+    # fallback does not allow concurrent launches, see launch_kernel)
+    if "NUMBA_THREADING_LAYER" not in os.environ:
+        numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+    return numba
+
+
+def launch_kernel(kernel, *args):
+    """
+    Call a parallel numba kernel. The workqueue layer (used when neither OpenMP nor TBB is
+    available, or when chosen through NUMBA_THREADING_LAYER) aborts the process on concurrent
+    launches, so launches are serialized unless the layer picked on the first launch is another one.
+    """
+    global _concurrent_launches_safe
+    if _concurrent_launches_safe:
+        return kernel(*args)
+    with _kernel_launch_lock:
+        result = kernel(*args)
+        try:
+            _concurrent_launches_safe = _import_numba().threading_layer() != "workqueue"
+        except ValueError:
+            pass  # No parallel region has run yet
+    return result
+
+# Hit kinds returned by token_hit_scores
+NAME_HIT_NONE, NAME_HIT_FIRST, NAME_HIT_MIDDLE, NAME_HIT_LAST = 0, 1, 2, 3
+
+# Below this many candidates, thread start-up costs more than the fuzzy scoring itself
+PARALLEL_FUZZY_MIN_CANDIDATES = 1000
+
+
+def scoring_backend() -> str:
+    """Name of the kernel behind cosine_scores/dot_scores, with the SIMD targets SimSIMD dispatches to"""
+    if SIMSIMD_AVAILABLE:
+        # SimSIMD picks a kernel specialized for the CPU (and dtype) at call time
+        targets = [name for name, enabled in simsimd.get_capabilities().items() if enabled and name != "serial"]
+        return f"SimSIMD ({', '.join(targets) or 'serial'})"
+    return "NumPy BLAS"
+
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """Return a C-contiguous float32 copy with every row scaled to unit length"""
+    matrix = np.array(embeddings, dtype=np.float32, order="C", ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.clip(norms, 1e-12, None)
+    return matrix
+
+
+def normalize_vector(embedding: np.ndarray) -> np.ndarray:
+    """Return a 1-D float32 unit-length copy of a single embedding (one vdot, no row reduction)"""
+    vector = np.array(embedding, dtype=np.float32).ravel()
+    vector /= max(np.sqrt(np.vdot(vector, vector)), 1e-12)
+    return vector
+
+
+def cosine_scores(query_embedding: np.ndarray, entity_embeddings: np.ndarray) -> np.ndarray:
+    """Cosine similarity of one query vector against every entity row, as a 1-D array"""
+    query = np.ascontiguousarray(query_embedding, dtype=np.float32).reshape(1, -1)
+    entities = np.ascontiguousarray(entity_embeddings, dtype=np.float32)
+
+    if SIMSIMD_AVAILABLE:
+        # SimSIMD returns cosine *distances*
+        distances = np.asarray(simsimd.cdist(query, entities, metric="cosine"), dtype=np.float32)
+        return 1.0 - distances.ravel()
+
+    return normalize_rows(entities) @ normalize_vector(query)
+
+
+def dot_scores(query_unit: np.ndarray, unit_matrix: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Cosine similarity for pre-normalized inputs: one dot product per entity row (written to out if given)"""
+    # Query takes the matrix dtype, so float16 matrices use SimSIMD's f16 kernel
+    query = np.ascontiguousarray(query_unit, dtype=unit_matrix.dtype).reshape(1, -1)
+
+    if SIMSIMD_AVAILABLE:
+        if out is None:
+            return np.asarray(simsimd.cdist(query, unit_matrix, metric="dot"), dtype=np.float32).ravel()
+        simsimd.cdist(query, unit_matrix, metric="dot", out=out.reshape(1, -1))
+        return out
+
+    return np.matmul(unit_matrix, query[0], out=out)
+
+
+def dot_matrix(query_units: np.ndarray, unit_matrix: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Cosine similarity of several pre-normalized queries against every entity row, shape (M, N), in one call (written to out if given)"""
+    queries = np.ascontiguousarray(query_units, dtype=unit_matrix.dtype).reshape(-1, unit_matrix.shape[1])
+    if SIMSIMD_AVAILABLE:
+        if out is None:
+            return np.asarray(simsimd.cdist(queries, unit_matrix, metric="dot"), dtype=np.float32)
+        simsimd.cdist(queries, unit_matrix, metric="dot", out=out)
+        return out
+    return np.matmul(queries, unit_matrix.T, out=out)
+
+
+def quantize_rows(unit_matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization: unit_matrix ~= quantized * scales[:, None]"""
+    matrix = np.asarray(unit_matrix, dtype=np.float32)
+    scales = np.clip(np.abs(matrix).max(axis=1), 1e-12, None) / 127.0
+    quantized = np.ascontiguousarray(np.rint(matrix / scales[:, None]), dtype=np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def int8_dot_scores(query_unit: np.ndarray, quantized: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """Approximate cosine of a normalized query against quantize_rows output (within ~0.01)"""
+    query = np.asarray(query_unit, dtype=np.float32).ravel()
+    query_scale = max(float(np.abs(query).max()), 1e-12) / 127.0
+    query_int8 = np.rint(query / query_scale).astype(np.int8).reshape(1, -1)
+    
+    if SIMSIMD_AVAILABLE:
+        # Integer dot products on the int8 rows: a quarter of the float32 memory traffic
+        dots = np.asarray(simsimd.cdist(query_int8, quantized, metric="dot")).ravel()
+    else:
+        dots = quantized.astype(np.float32) @ query_int8[0].astype(np.float32)
+    return (dots * (scales * query_scale)).astype(np.float32)
+
+
+def top_k_positions(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k highest scores, in ascending position order, by O(N) partial selection.
+    Ties at the cutoff are taken in position order, as a stable descending sort would.
+    """
+    if k >= len(scores):
+        return np.arange(len(scores))
+    cutoff = -np.partition(-scores, k - 1)[k - 1]
+    above_cutoff = np.flatnonzero(scores > cutoff)
+    at_cutoff = np.flatnonzero(scores == cutoff)[:k - len(above_cutoff)]
+    return np.sort(np.concatenate([above_cutoff, at_cutoff]))
+
+
+class ScoreBuffer:
+    """Reusable float32 score vector for dot_scores(out=...), one per thread"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, size: int) -> np.ndarray:
+        buffer = getattr(self._local, "scores", None)
+        if buffer is None or buffer.shape[0] != size:
+            buffer = np.empty(size, dtype=np.float32)
+            self._local.scores = buffer
+        return buffer
+
+
+def build_ip_index(unit_matrix: np.ndarray):
+    """Exact FAISS inner-product index over pre-normalized rows (inner product == cosine)"""
+    matrix = np.ascontiguousarray(unit_matrix, dtype=np.float32)
+    index = faiss.IndexFlatIP(matrix.shape[1])
+    index.add(matrix)
+    return index
+
+
+def ip_index_scores(index, query_unit: np.ndarray) -> np.ndarray:
+    """Cosine similarity of a normalized query against every indexed row, in insertion order"""
+    query = np.ascontiguousarray(query_unit, dtype=np.float32).reshape(1, -1)
+    distances, ids = index.search(query, index.ntotal)
+    scores = np.empty(index.ntotal, dtype=np.float32)
+    scores[ids[0]] = distances[0]
+    return scores
+
+
+def ip_index_score_matrix(index, query_units: np.ndarray) -> np.ndarray:
+    """Cosine similarity of several normalized queries against every indexed row, shape (M, N), in one index search"""
+    queries = np.ascontiguousarray(query_units, dtype=np.float32).reshape(-1, index.d)
+    distances, ids = index.search(queries, index.ntotal)
+    scores = np.empty((len(queries), index.ntotal), dtype=np.float32)
+    np.put_along_axis(scores, ids, distances, axis=1)
+    return scores
+
+
+def _combine_kernel():
+    """Numba score-combination kernel, compiled on first use (None without numba)"""
+    global _combine_scores_jit
+    if _combine_scores_jit is None and NUMBA_AVAILABLE:
+        numba = _import_numba()
+        if numba is None:
+            return None
+        
+        @numba.njit(cache=True, parallel=True)
+        def combine_scores_jit(semantic, fuzzy, fuzzy_weight):
+            out = np.empty(semantic.shape[0], dtype=np.float64)
+            for i in numba.prange(semantic.shape[0]):
+                if fuzzy[i] > 0:
+                    out[i] = fuzzy_weight * fuzzy[i] + (1.0 - fuzzy_weight) * semantic[i]
+                else:
+                    out[i] = semantic[i]
+            return out
+        
+        _combine_scores_jit = combine_scores_jit
+    return _combine_scores_jit
+
+
+def combine_scores(semantic: np.ndarray, fuzzy: np.ndarray, fuzzy_weight: float = 0.7) -> np.ndarray:
+    """Blend fuzzy and semantic scores per entity; entities without a fuzzy score keep the semantic one"""
+    semantic = np.asarray(semantic, dtype=np.float64)
+    fuzzy = np.asarray(fuzzy, dtype=np.float64)
+    kernel = _combine_kernel()
+    if kernel is not None:
+        return launch_kernel(kernel, semantic, fuzzy, fuzzy_weight)
+    return np.where(fuzzy > 0, fuzzy_weight * fuzzy + (1.0 - fuzzy_weight) * semantic, semantic)
+
+
+def _stack_max_kernel():
+    """Numba fused cosine-and-max kernel over a (V, N, D) unit stack, compiled on first use (None without numba)"""
+    global _stack_max_jit
+    if _stack_max_jit is None and NUMBA_AVAILABLE:
+        numba = _import_numba()
+        if numba is None:
+            return None
+        
+        # Separate 3-D stack / 2-D query signatures keep type inference to one specialization
+        @numba.njit(cache=True, parallel=True, fastmath=True)
+        def stack_max_scores_jit(unit_stack, query_units):
+            views, n, dim = unit_stack.shape
+            out = np.empty(n, dtype=np.float32)
+            for i in numba.prange(n):
+                best = np.float32(-np.inf)
+                for v in range(views):
+                    s = np.float32(0.0)
+                    for k in range(dim):
+                        s += query_units[v, k] * unit_stack[v, i, k]
+                    if s > best:
+                        best = s
+                out[i] = best
+            return out
+        
+        _stack_max_jit = stack_max_scores_jit
+    return _stack_max_jit
+
+
+def stack_max_scores(unit_stack: np.ndarray, query_units: np.ndarray) -> np.ndarray:
+    """
+    Per entity, the highest cosine over the views of a (V, N, D) unit-normalized stack,
+    view v scored against query row v. The numba kernel computes and reduces the V
+    dot products in one pass instead of materializing the (V, N) matmul result.
+    """
+    kernel = _stack_max_kernel()
+    if kernel is not None and unit_stack.dtype == np.float32 and unit_stack.flags.c_contiguous:
+        return launch_kernel(kernel, unit_stack, np.ascontiguousarray(query_units, dtype=np.float32))
+    return np.matmul(unit_stack, query_units[:, :, None])[:, :, 0].max(axis=0)
+
+
+def build_token_hits(token_kinds: List[Dict[str, int]]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Inverted index over name tokens: token -> (entity indices, hit kinds), built from one
+    {token: NAME_HIT_* kind} dict per entity, so a token lookup replaces a scan over all entities.
+    """
+    postings = {}
+    for idx, kinds in enumerate(token_kinds):
+        for token, kind in kinds.items():
+            postings.setdefault(token, []).append((idx, kind))
+    return {
+        token: (np.array([idx for idx, _ in hits], dtype=np.intp), np.array([kind for _, kind in hits], dtype=np.int8))
+        for token, hits in postings.items()
+    }
+
+
+def token_hit_scores(token_hits: Dict[str, Tuple[np.ndarray, np.ndarray]], token: str,
+                     hit_scores: Tuple[float, float, float], fallback: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score every entity on whether the token is its first, a middle, or its last name token (see build_token_hits).
+    hit_scores holds the (first, middle, last) scores; entities without a hit get their fallback score.
+    Returns (scores, kinds) with kinds one of the NAME_HIT_* constants.
+    """
+    scores = np.array(fallback, dtype=np.float64)
+    kinds = np.zeros(len(scores), dtype=np.int8)
+    if token in token_hits:
+        indices, hit_kinds = token_hits[token]
+        scores[indices] = np.array((0.0, *hit_scores))[hit_kinds]
+        kinds[indices] = hit_kinds
+    return scores, kinds
+
+
+def build_hnsw_index(unit_matrix: np.ndarray, ef_construction: int = 200, M: int = 16, ef: int = 64):
+    """Approximate HNSW cosine index over the entity rows (labels are row positions)"""
+    matrix = np.ascontiguousarray(unit_matrix, dtype=np.float32)
+    index = hnswlib.Index(space="cosine", dim=matrix.shape[1])
+    index.init_index(max_elements=len(matrix), ef_construction=ef_construction, M=M)
+    index.add_items(matrix, np.arange(len(matrix)))
+    index.set_ef(ef)
+    return index
+
+
+def hnsw_top_scores(index, query_unit: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row positions and cosine similarities of the (approximately) k nearest rows"""
+    query = np.ascontiguousarray(query_unit, dtype=np.float32).reshape(1, -1)
+    labels, distances = index.knn_query(query, k=k)
+    return labels[0].astype(np.intp), 1.0 - distances[0]
+
+
+def fuzzy_ratio(s1: str, s2: str, use_rapidfuzz: bool = True) -> float:
+    """Case-insensitive fuzzy similarity of two strings in [0, 1]"""
+    if use_rapidfuzz and RAPIDFUZZ_AVAILABLE:
+        return fuzz.ratio(s1.lower(), s2.lower()) / 100.0
+    return SequenceMatcher(None, s1.lower(), s2.lower()).ratio()
+
+
+def fuzzy_scores(query: str, candidates: List[str], use_rapidfuzz: bool = True,
+                 score_cutoff: float = 0.0, candidate_lengths: Optional[np.ndarray] = None,
+                 candidates_lowercased: bool = False) -> np.ndarray:
+    """
+    Case-insensitive fuzzy similarity of one query against every candidate, in [0, 1] (0 below score_cutoff).
+    With candidate_lengths (lengths of the lowercased candidates), candidates that cannot reach
+    the cutoff on length alone are never scored. With candidates_lowercased, the candidates are
+    taken as already lowercased (e.g. precomputed in the entity index) and only the query is lowered.
+    """
+    if score_cutoff > 0 and candidate_lengths is not None:
+        # ratio = 2 * matching chars / (len1 + len2) and at most the shorter string can match,
+        # so e.g. at 0.85 the shorter string needs ~74% of the longer one's length
+        query_length = len(query.lower())
+        reachable = np.flatnonzero(2 * np.minimum(candidate_lengths, query_length)
+                                   >= score_cutoff * (candidate_lengths + query_length) - 1e-9)
+        scores = np.zeros(len(candidates))
+        if len(reachable):
+            scores[reachable] = fuzzy_scores(query, [candidates[idx] for idx in reachable],
+                                             use_rapidfuzz, score_cutoff, candidates_lowercased=candidates_lowercased)
+        return scores
+    
+    if use_rapidfuzz and RAPIDFUZZ_AVAILABLE:
+        workers = -1 if len(candidates) >= PARALLEL_FUZZY_MIN_CANDIDATES else 1
+        # With a cutoff RapidFuzz can abandon hopeless candidates early
+        if candidates_lowercased:
+            scores = process.cdist([query.lower()], candidates, scorer=fuzz.ratio,
+                                   dtype=np.float64, workers=workers, score_cutoff=score_cutoff * 100)
+        else:
+            scores = process.cdist([query], candidates, scorer=fuzz.ratio, processor=str.lower,
+                                   dtype=np.float64, workers=workers, score_cutoff=score_cutoff * 100)
+        return scores[0] / 100.0
+
+    query_lower = query.lower()
+    if not candidates_lowercased:
+        candidates = [c.lower() for c in candidates]
+    scores = np.array([SequenceMatcher(None, query_lower, c).ratio() for c in candidates])
+    scores[scores < score_cutoff] = 0.0
+    return scores
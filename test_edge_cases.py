@@ -1,6 +1,7 @@
 import time
 import numpy as np
 from entity_disambiguation import EntityDisambiguator
+from similarity import cosine_scores
 
 
 def main():
@@ -118,8 +119,7 @@ def main():
     
     for query, desc in comparison_queries:
         query_embedding = disambiguator.model.encode([query]).reshape(1, -1)
-        from sklearn.metrics.pairwise import cosine_similarity
-        similarity = cosine_similarity(query_embedding, entity_embeddings[target_idx].reshape(1, -1))[0][0]
+        similarity = cosine_scores(query_embedding, entity_embeddings[target_idx:target_idx + 1])[0]
         print(f"  '{query}' ({desc}): {similarity:.4f}")
     
     # Summary
@@ -28,7 +28,7 @@ def test_middle_names():
     print("\nEXTRACTED NAME PARTS:")
     print("-"*80)
     for i, entity in enumerate(entities):
-        name_parts = entity_embeddings["name_parts"][i]
+        name_parts = disambiguator.entity_name_parts(entity_embeddings, i)
         print(f"Entity: {entity['descriptor']}")
         print(f"  Full name: '{name_parts['full']}'")
         print(f"  First: '{name_parts['first']}'")